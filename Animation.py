@@ -1,6 +1,92 @@
+import time
+from dash import Output, Input, State, Patch, dash, html, dcc
 import numpy as np
 import plotly.graph_objs as go
-from dash import Output, Input, dash, html, dcc
+
+from data_processing import decimate_minmax
+from plot_setup import setup_plot
+from metrics import metrics, register_endpoints
+from frame_stream import register_frame_stream, stream_component, assets_ignore
+from utils import DISPLAY_WIDTH, HISTORY_MAX_MARKERS, FRAME_TRANSPORT
+
+
+METRICS_STYLE = {'font-family': 'monospace', 'font-size': '12px', 'color': '#555'}
+
+
+def metrics_panel():
+    """Compact per-stage stats for a stats panel."""
+    return [html.Div(line) for line in metrics.summary()]
+
+
+def coincidence_text(matcher, sample_rate):
+    """One line per channel pair: matched peaks, delay statistics and unmatched peaks on either side."""
+    lines = []
+    for row in matcher.summary(sample_rate):
+        line = f"{row['reference'].upper()}-{row['other'].upper()} coincidences: {row['matched']}"
+        if row['matched']:
+            line += (f", delay mean {1000 * row['delay_mean_s']:.3f} ms, std {1000 * row['delay_std_s']:.3f} ms, "
+                     f"range {1000 * row['delay_min_s']:.3f} to {1000 * row['delay_max_s']:.3f} ms")
+        line += f" | Unmatched: {row['unmatched_reference']} / {row['unmatched_other']}"
+        lines.append(line)
+    return lines
+
+
+def delay_histogram_figure(matcher, sample_rate):
+    """Delay histogram of the coincidences of every channel pair, one bar trace per pair."""
+    fig = go.Figure()
+    centers = 1000 * matcher.bin_centers() / sample_rate
+    reference = matcher.channels[matcher.reference].upper()
+    for c in matcher.others:
+        fig.add_trace(go.Bar(x=centers, y=matcher.histogram[c], name=f"{reference}-{matcher.channels[c].upper()}"))
+    fig.update_layout(title="Coincidence Delay", xaxis=dict(title="Delay (ms)"), yaxis=dict(title="Coincidences"),
+                      barmode='overlay', bargap=0, height=300)
+    return fig
+
+
+def history_figure(channels, events=None):
+    """Peak history plot with one marker trace per channel, holding `events` (see PeakEventLog.query)."""
+    fig = go.Figure()
+    for channel in channels:
+        x, y = [], []
+        if events is not None:
+            selected = events['channel'] == channel
+            x, y = events['time'][selected], events['value'][selected]
+        fig.add_trace(go.Scattergl(x=x, y=y, mode='markers', name=f"{channel.upper()} Peaks",
+                                   marker=dict(symbol='x', size=6)))
+    fig.update_layout(title="Peak History", xaxis=dict(title="Time (s)"), yaxis=dict(title="Peak Value"), height=300)
+    return fig
+
+
+def history_update(event_log, channels, shown, max_events=HISTORY_MAX_MARKERS):
+    """
+    Incremental update of the peak history plot: only peaks logged since the last update are read
+    and appended, so the cost of a refresh follows the new peaks rather than the whole run.
+
+    :param event_log: PeakEventLog of the current run.
+    :param channels: Channel names of the run, in trace order.
+    :param shown: [run id, rowid] of the last update (kept in a dcc.Store by the page), or None.
+    :param max_events: Markers per channel kept on the plot (the run is thinned to about this many,
+                       the oldest are dropped after that).
+    :return: Tuple (extendData, figure, shown): the whole thinned run as a new figure when the run
+             changed, otherwise the new peaks to append (no_update when there are none).
+    """
+    if event_log.run is None:
+        return dash.no_update, history_figure(channels), None
+    new_run = shown is None or shown[0] != event_log.run
+    events, rowid = event_log.events_after(None if new_run else shown[1], max_events)
+    shown = [event_log.run, rowid]
+    if new_run:
+        return dash.no_update, history_figure(channels, events), shown
+    if not len(events['time']):
+        return dash.no_update, dash.no_update, shown
+
+    x, y = [], []
+    for channel in channels:
+        selected = events['channel'] == channel
+        x.append(events['time'][selected])
+        y.append(events['value'][selected])
+    caps = [max_events] * len(channels)
+    return (dict(x=x, y=y), list(range(len(channels))), {'x': caps, 'y': caps}), dash.no_update, shown
 
 
 class Animator:
@@ -8,66 +94,159 @@ class Animator:
         self.analyzer = analyzer
 
     def update_plot(self, n):
-        if self.analyzer.data_queue.empty():
-            return dash.no_update
+        """
+        Build the delta for the live graph from the next processed chunk.
 
-        # Retrieve data from queue
+        Only the new chunk is sent: its decimated samples and peak markers are appended to the
+        existing traces (capped to the display window) and the x-axis range is shifted.
+
+        :return: Tuple (extendData, figure Patch), or no_update for both when no chunk is pending.
+        """
+        # The channel set changed: send the new empty figure before appending to it
+        if self.analyzer.figure_reset:
+            self.analyzer.figure_reset = False
+            return dash.no_update, self.analyzer.fig
+
+        # Retrieve data from queue (pending chunks may come merged into one, see FrameQueue)
         data = self.analyzer.data_queue.get()
-        self.analyzer.processed_duration += self.analyzer.display_time
+        if data is None:
+            return dash.no_update, dash.no_update
+
+        metrics.observe('adc_frame_latency_seconds', time.monotonic() - data['produced_at'], transport='poll')
+        with metrics.timed('display_update', len(data['signals'])):
+            frame = self.build_frame(data)
+
+        # extendData cannot take typed array specs, so polled frames go out as JSON lists
+        layout = Patch()
+        layout['layout']['xaxis']['range'] = frame['range']
+        return (dict(x=frame['x'], y=frame['y']), frame['traces'], frame['max_points']), layout
 
-        # Update buffers for ADC1 and ADC2
-        self.analyzer.adc1_buffer.extend(data['adc1'][-self.analyzer.display_points:])
-        self.analyzer.adc2_buffer.extend(data['adc2'][-self.analyzer.display_points:])
+    def build_frame(self, data):
+        """
+        Display update for one processed chunk, shared by polling (`update_plot`) and push (frame_stream.py).
+
+        :return: Dict with the points to append ('x' times and 'y' samples in their store type, one array
+                 per trace), the 'traces' they go to, the per-trace 'max_points' of the display window
+                 keyed like the update ({'x': [...], 'y': [...]}, as Plotly.extendTraces expects) and the
+                 new x-axis 'range'.
+        """
+        # Update the display window for all channels
+        self.analyzer.buffer_frame(data)
 
         # Update peak counts
-        self.analyzer.adc1_peak_count += len(data['adc1_peaks'])
-        self.analyzer.adc2_peak_count += len(data['adc2_peaks'])
-
-        # Calculate time values for scrolling effect
-        start_time = max(0, self.analyzer.processed_duration - self.analyzer.display_time)
-        time_values = np.linspace(start_time, self.analyzer.processed_duration, len(self.analyzer.adc1_buffer))
-
-        # Prepare data for updating the figure
-        traces = [
-            # ADC1 Signal
-            go.Scatter(x=time_values, y=list(self.analyzer.adc1_buffer), mode='lines', name='ADC1 Signal',
-                       line=dict(color='blue')),
-            # ADC1 Peaks
-            go.Scatter(x=[time_values[peak] for peak in data['adc1_peaks']],
-                       y=[self.analyzer.adc1_buffer[peak] for peak in data['adc1_peaks']], mode='markers',
-                       name='ADC1 Peaks', marker=dict(color='red', size=10, symbol='x')),
-
-            # ADC2 Signal
-            go.Scatter(x=time_values, y=list(self.analyzer.adc2_buffer), mode='lines', name='ADC2 Signal',
-                       line=dict(color='green')),
-            # ADC2 Peaks
-            go.Scatter(x=[time_values[peak] for peak in data['adc2_peaks']],
-                       y=[self.analyzer.adc2_buffer[peak] for peak in data['adc2_peaks']], mode='markers',
-                       name='ADC2 Peaks', marker=dict(color='red', size=10, symbol='x'))
-        ]
-
-        # Update figure layout and data
-        self.analyzer.fig.update_traces(overwrite=True)
-        self.analyzer.fig.update_xaxes(range=[start_time, self.analyzer.processed_duration])
-        return traces
-
-    def start_animation(self):
-        app = dash.Dash(__name__)
+        counts = [len(peaks) for peaks in data['peaks']]
+        self.analyzer.peak_counts += counts
+
+        # Time values come from absolute sample indices, so the window scrolls with the data
+        sample_rate = self.analyzer.sample_rate
+        n_samples = len(data['signals'])
+        end_time = (data['start'] + n_samples) / sample_rate
+        start_time = max(0, end_time - self.analyzer.display_time)
+
+        # Decimate the chunk to its share of the plot width, keeping the extremes of every pixel column
+        window_points = 2 * DISPLAY_WIDTH
+        chunk_points = max(2, window_points * n_samples // self.analyzer.display_points)
+        signal_idx, signal_y = decimate_minmax(data['signals'], chunk_points)
+
+        # Peak indices are global sample positions; peak values of all channels come from the display
+        # window in one lookup
+        channel = np.repeat(np.arange(len(counts)), counts)
+        peaks = np.concatenate(data['peaks']) if sum(counts) else np.empty(0, dtype=np.int64)
+        _, samples = self.analyzer.display_buffer.view()
+        positions, found = self.analyzer.display_buffer.locate(peaks)
+        values = np.full(len(peaks), np.nan)
+        values[found] = samples[positions, channel[found]]
+
+        # Trace order matches setup_plot: signal then peaks of every channel
+        x, y = [], []
+        bounds = np.cumsum([0] + counts)
+        for i in range(len(counts)):
+            visible = slice(bounds[i], bounds[i + 1])
+            shown = found[visible]
+            x += [(data['start'] + signal_idx[:, i]) / sample_rate, peaks[visible][shown] / sample_rate]
+            y += [signal_y[:, i], values[visible][shown].astype(signal_y.dtype)]
+
+        # A window cannot hold more peaks than runs of min_duration samples
+        peak_points = self.analyzer.display_points // self.analyzer.min_duration
+        max_points = [window_points, peak_points] * len(counts)
+        # extendTraces takes per-trace caps only keyed like the update; a flat list means no cap at all
+        max_points = {'x': max_points, 'y': max_points}
+
+        return {'x': x, 'y': y, 'traces': list(range(2 * len(counts))), 'max_points': max_points,
+                'range': [start_time, end_time]}
+
+    def lag_text(self):
+        """Display lag and queue state for the UI."""
+        queue = self.analyzer.data_queue
+        return (f"Display lag: {queue.lag():.2f} s | Pending frames: {queue.qsize()}/{queue.maxsize} | "
+                f"Dropped: {queue.dropped} | Coalesced: {queue.coalesced} ({queue.policy})")
+
+    def start_animation(self, transport=FRAME_TRANSPORT):
+        app = dash.Dash(__name__, assets_ignore=assets_ignore(transport))
+        register_endpoints(app.server)
+        setup_plot(self.analyzer)
+        if transport == 'push':
+            register_frame_stream(app.server, self)
 
         # Layout
         app.layout = html.Div([
             html.H1("Real-Time Dual ADC Signal Analyzer"),
             dcc.Graph(id="live-graph", figure=self.analyzer.fig),
-            dcc.Interval(id="interval-component", interval=1000)  # Update interval in ms
+            html.Div(id="lag-output"),
+            html.Div(id="coincidence-output"),
+            dcc.Graph(id="delay-histogram"),
+            dcc.Graph(id="peak-history"),
+            dcc.Store(id="peak-history-shown"),
+            html.Div(id="metrics-output", style=METRICS_STYLE),
+            dcc.Interval(id="metrics-interval", interval=1000),
+            # Frames are pushed as they are produced, or polled at an update interval in ms
+            stream_component("live-graph") if transport == 'push' else
+            dcc.Interval(id="interval-component", interval=1000)
         ])
 
-        # Callback to update the figure at each interval
+        if transport == 'poll':
+            # Callback to append the newest chunk to the figure at each interval
+            @app.callback(
+                Output("live-graph", "extendData"),
+                Output("live-graph", "figure"),
+                Input("interval-component", "n_intervals")
+            )
+            def update_graph_live(n_intervals):
+                return self.update_plot(n_intervals)
+
+        @app.callback(
+            Output("lag-output", "children"),
+            Input("interval-component" if transport == 'poll' else "metrics-interval", "n_intervals")
+        )
+        def update_lag(n_intervals):
+            return self.lag_text()
+
+        @app.callback(
+            Output("metrics-output", "children"),
+            Input("metrics-interval", "n_intervals")
+        )
+        def update_metrics(n_intervals):
+            return metrics_panel()
+
+        @app.callback(
+            Output("peak-history", "extendData"),
+            Output("peak-history", "figure"),
+            Output("peak-history-shown", "data"),
+            Input("metrics-interval", "n_intervals"),
+            State("peak-history-shown", "data")
+        )
+        def update_history(n_intervals, shown):
+            return history_update(self.analyzer.event_log, self.analyzer.channel_names, shown)
+
         @app.callback(
-            Output("live-graph", "figure"),
-            Input("interval-component", "n_intervals")
+            Output("coincidence-output", "children"),
+            Output("delay-histogram", "figure"),
+            Input("metrics-interval", "n_intervals")
         )
-        def update_graph_live(n_intervals):
-            return go.Figure(data=self.update_plot(n_intervals))
+        def update_coincidences(n_intervals):
+            matcher, sample_rate = self.analyzer.coincidences, self.analyzer.sample_rate
+            return ([html.Div(line) for line in coincidence_text(matcher, sample_rate)],
+                    delay_histogram_figure(matcher, sample_rate))
 
         # Run the Dash app
         app.run_server(debug=True)
@@ -0,0 +1,108 @@
+// Push-based live display: receives frames from the server as Server-Sent Events (see frame_stream.py)
+// and draws them with Plotly.extendTraces, instead of polling with dcc.Interval.
+(function () {
+    var source = null;
+    var TYPED_ARRAYS = {
+        i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+        i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array
+    };
+
+    // Frame arrays arrive as {dtype, bdata} specs (see data_processing.typed_array), which
+    // Plotly.extendTraces does not decode itself
+    function decode(spec) {
+        if (!spec || spec.bdata === undefined) {
+            return spec;
+        }
+        var bytes = atob(spec.bdata);
+        var buffer = new Uint8Array(bytes.length);
+        for (var i = 0; i < bytes.length; i++) {
+            buffer[i] = bytes.charCodeAt(i);
+        }
+        return new TYPED_ARRAYS[spec.dtype](buffer.buffer);
+    }
+
+    // extendTraces only appends to an array of the same type: convert the trace's data once
+    function matchTypes(gd, update, traces) {
+        ['x', 'y'].forEach(function (key) {
+            update[key].forEach(function (values, i) {
+                var trace = gd.data[traces[i]];
+                if (!trace[key] || trace[key].constructor !== values.constructor) {
+                    trace[key] = new values.constructor(trace[key] || []);
+                }
+            });
+        });
+    }
+
+    function graphDiv(graphId) {
+        var container = document.getElementById(graphId);
+        return container && container.querySelector('.js-plotly-plot');
+    }
+
+    function acknowledge(url, producedAt) {
+        fetch(url + '/ack', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({produced_at: producedAt}),
+            keepalive: true
+        }).catch(function () {});
+    }
+
+    function connect(element) {
+        var url = element.dataset.url;
+        var graphId = element.dataset.graph;
+        var input = document.getElementById('max-fps');
+        var maxFps = input && input.value ? input.value : element.dataset.maxFps;
+
+        if (source) {
+            source.close();
+        }
+        source = new EventSource(url + '?max_fps=' + encodeURIComponent(maxFps));
+
+        source.addEventListener('figure', function (event) {
+            var gd = graphDiv(graphId);
+            if (gd) {
+                var figure = JSON.parse(event.data);
+                Plotly.react(gd, figure.data, figure.layout);
+            }
+        });
+
+        source.addEventListener('frame', function (event) {
+            var gd = graphDiv(graphId);
+            if (!gd) {
+                return;
+            }
+            var frame = JSON.parse(event.data);
+            var update = {x: frame.x.map(decode), y: frame.y.map(decode)};
+            matchTypes(gd, update, frame.traces);
+            // max_points is {x: [...], y: [...]}: per-trace caps must be keyed like the update
+            Plotly.extendTraces(gd, update, frame.traces, frame.max_points)
+                .then(function () {
+                    return Plotly.relayout(gd, {'xaxis.range': frame.range});
+                })
+                .then(function () {
+                    // Acknowledge once the frame is painted, for the end-to-end latency metric
+                    requestAnimationFrame(function () {
+                        acknowledge(url, frame.produced_at);
+                    });
+                });
+        });
+    }
+
+    // Dash renders the layout after this script runs: connect once the stream element exists. Only
+    // pages that push frames load this script (see frame_stream.assets_ignore), so the element comes.
+    var waiting = setInterval(function () {
+        var element = document.getElementById('frame-stream');
+        if (element && graphDiv(element.dataset.graph)) {
+            clearInterval(waiting);
+            connect(element);
+        }
+    }, 200);
+
+    // Reconnect with the new frame rate cap
+    document.addEventListener('change', function (event) {
+        var element = document.getElementById('frame-stream');
+        if (event.target.id === 'max-fps' && element) {
+            connect(element);
+        }
+    });
+})();
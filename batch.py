@@ -0,0 +1,332 @@
+import argparse
+import csv
+import glob
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Headless: only the detection modules, no dash/plotly, so the CLI and its workers start fast
+from data_processing import process_chunk, peak_values, StreamingPeakDetector
+from coincidence import CoincidenceMatcher
+from sample_store import SampleStore
+from utils import CHUNK_SIZE, SAMPLE_RATE, COINCIDENCE_TOLERANCE
+
+REPORT_FORMATS = ('csv', 'json')
+PEAK_FIELDS = ('channel', 'sample', 'time', 'width', 'value')
+COINCIDENCE_FIELDS = ('reference', 'other', 'reference_sample', 'other_sample', 'delay')
+_END = object()
+
+
+def expand_inputs(patterns):
+    """Capture files matching paths, glob patterns or directories (their .bin and .csv files), sorted."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '*.bin')) + glob.glob(os.path.join(pattern, '*.csv')))
+        elif glob.has_magic(pattern):
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            logging.error(f"No such capture file: {pattern}")
+    return sorted(paths)
+
+
+def report_names(paths):
+    """Report file name stem per capture: its file name without extension, numbered when names repeat."""
+    names, seen = {}, {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names[path] = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+    return names
+
+
+def _numbered(blocks):
+    """(start, block) pairs of consecutive blocks."""
+    start = 0
+    for block in blocks:
+        yield start, block
+        start += len(block)
+
+
+def _with_last(iterable):
+    """Items of `iterable` paired with a flag marking the last one."""
+    iterator = iter(iterable)
+    item = next(iterator, _END)
+    while item is not _END:
+        following = next(iterator, _END)
+        yield item, following is _END
+        item = following
+
+
+def _open_capture(path, chunk_size, sample_rate):
+    """
+    Open a capture for streaming.
+
+    Sample stores are memory-mapped and carry their sample rate; CSV files are parsed block by block
+    and use `sample_rate`.
+
+    :return: Tuple (channel names, sample rate, iterator of (start, block) chunks, whole capture as a
+             memory map or None for CSV).
+    """
+    if path.lower().endswith('.csv'):
+        from ingest import read_csv_blocks  # pandas is only needed for CSV captures
+
+        blocks = read_csv_blocks(path, block_rows=chunk_size)
+        first = next(blocks, None)
+        if first is None:
+            raise ValueError("CSV file contains no samples")
+        return first[0], sample_rate, _numbered(block for _, block in itertools.chain([first], blocks)), None
+
+    store = SampleStore(path)
+    chunks = ((i, store.data[i:i + chunk_size]) for i in range(0, len(store), chunk_size))
+    return store.channel_names, store.sample_rate, chunks, store.data
+
+
+def analyze_file(path, threshold=850, min_duration=50, chunk_size=CHUNK_SIZE, sample_rate=SAMPLE_RATE,
+                 tolerance=COINCIDENCE_TOLERANCE):
+    """
+    Stream one capture through `process_chunk` with a StreamingPeakDetector over all of its channels,
+    and pair the first channel's peaks with every other channel's with a CoincidenceMatcher.
+
+    Only one chunk (two for CSV captures) is held at a time, so captures of any length fit in memory.
+
+    :param path: Sample store or CSV file.
+    :param threshold: The threshold value to detect peaks.
+    :param min_duration: Minimum run length of a peak, in samples.
+    :param chunk_size: Samples per chunk.
+    :param sample_rate: Sample rate of CSV captures in Hz (sample stores carry their own).
+    :param tolerance: Maximum delay in samples between coincident peaks.
+    :return: Tuple (stats, peaks, coincidences): a dict of capture, per-channel and per-pair statistics,
+             a dict of arrays PEAK_FIELDS in time order, and a dict of arrays COINCIDENCE_FIELDS (delay
+             in seconds) in reference time order. Peak values further back than the previous chunk of
+             a CSV capture are NaN.
+    """
+    start_time = time.perf_counter()
+    channels, rate, chunks, data = _open_capture(path, chunk_size, sample_rate)
+    detector = StreamingPeakDetector(threshold, min_duration, len(channels))
+    matcher = CoincidenceMatcher(channels, tolerance)
+
+    found = []  # (channel, sample, width, value) arrays per chunk
+    pairs = []  # (other, reference sample, other sample) per channel pair and chunk
+    previous = None
+    n_samples = 0
+    for (start, block), final in _with_last(chunks):
+        result = process_chunk(block, threshold, detector=detector, final=final, channels=channels)
+        if result is None:
+            raise ValueError(f"Peak detection failed at sample {start}")
+        # Coincidences close to the chunk end are held back until the next chunk's peaks are known
+        final_pairs = matcher.update(result['peaks'], result.get('horizon'))
+        for other, (reference_samples, other_samples) in final_pairs.items():
+            pairs.append((np.full(len(other_samples), other, dtype=object), reference_samples, other_samples))
+        counts = [len(peaks) for peaks in result['peaks']]
+        if sum(counts):
+            channel = np.repeat(np.arange(len(channels)), counts)
+            samples = np.concatenate(result['peaks'])
+            # Peaks are run midpoints and may lie in an earlier chunk
+            held = [(0, data)] if data is not None else [(start, block)] + ([previous] if previous else [])
+            found.append((channel, samples, np.concatenate(result['peak_widths']),
+                          peak_values(held, samples, channel)))
+        previous = (start, block)
+        n_samples = start + len(block)
+
+    if found:
+        channel, samples, widths, values = (np.concatenate(parts) for parts in zip(*found))
+    else:
+        channel, samples, widths = (np.empty(0, dtype=np.int64) for _ in range(3))
+        values = np.empty(0)
+    order = np.argsort(samples, kind='stable')
+    channel, samples, widths, values = channel[order], samples[order], widths[order], values[order]
+
+    # Per-channel means, over the peaks that have a value
+    counts = np.bincount(channel, minlength=len(channels))
+    known = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_values = (np.bincount(channel[known], weights=values[known], minlength=len(channels)) /
+                       np.bincount(channel[known], minlength=len(channels)))
+        mean_widths = np.bincount(channel, weights=widths, minlength=len(channels)) / counts
+
+    seconds = time.perf_counter() - start_time
+    stats = {
+        'path': path,
+        'channels': list(channels),
+        'sample_rate': rate,
+        'samples': n_samples,
+        'duration_s': n_samples / rate,
+        'peaks': {name: int(count) for name, count in zip(channels, counts)},
+        'mean_peak_value': {name: None if np.isnan(v) else float(v) for name, v in zip(channels, mean_values)},
+        'mean_peak_width': {name: None if np.isnan(w) else float(w) for name, w in zip(channels, mean_widths)},
+        'coincidences': matcher.summary(rate),
+        'seconds': seconds,
+        'samples_per_s': n_samples / seconds if seconds > 0 else 0.0,
+    }
+    peaks = {'channel': np.asarray(channels, dtype=object)[channel], 'sample': samples, 'time': samples / rate,
+             'width': widths, 'value': values}
+
+    if pairs:
+        other, reference_samples, other_samples = (np.concatenate(parts) for parts in zip(*pairs))
+    else:
+        other = np.empty(0, dtype=object)
+        reference_samples = other_samples = np.empty(0, dtype=np.int64)
+    order = np.argsort(reference_samples, kind='stable')
+    coincidences = {'reference': np.full(len(order), channels[0], dtype=object), 'other': other[order],
+                    'reference_sample': reference_samples[order], 'other_sample': other_samples[order],
+                    'delay': (other_samples[order] - reference_samples[order]) / rate}
+    return stats, peaks, coincidences
+
+
+def write_reports(stats, peaks, coincidences, stem, output_dir, formats=REPORT_FORMATS):
+    """
+    Write the peak report of one capture.
+
+    'csv' writes `<stem>.peaks.csv`, one row per peak (PEAK_FIELDS, empty value when unknown), and
+    `<stem>.coincidences.csv`, one row per matched pair (COINCIDENCE_FIELDS); 'json' writes `<stem>.json`
+    with the capture statistics, the peaks as columns under 'peak_events' and the pairs under
+    'coincidence_events'.
+
+    :return: List of written paths.
+    """
+    written = []
+    if 'csv' in formats:
+        path = os.path.join(output_dir, f'{stem}.peaks.csv')
+        values = ['' if v != v else v for v in peaks['value'].tolist()]  # NaN -> empty
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(PEAK_FIELDS)
+            writer.writerows(zip(peaks['channel'].tolist(), peaks['sample'].tolist(), peaks['time'].tolist(),
+                                 peaks['width'].tolist(), values))
+        written.append(path)
+
+        path = os.path.join(output_dir, f'{stem}.coincidences.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COINCIDENCE_FIELDS)
+            writer.writerows(zip(*(coincidences[name].tolist() for name in COINCIDENCE_FIELDS)))
+        written.append(path)
+    if 'json' in formats:
+        path = os.path.join(output_dir, f'{stem}.json')
+        columns = {name: peaks[name].tolist() for name in PEAK_FIELDS}
+        columns['value'] = [None if v != v else v for v in columns['value']]  # NaN -> null
+        with open(path, 'w') as f:
+            json.dump(dict(stats, peak_events=columns,
+                           coincidence_events={name: coincidences[name].tolist() for name in COINCIDENCE_FIELDS}), f)
+        written.append(path)
+    return written
+
+
+def process_file(path, stem, output_dir, formats=REPORT_FORMATS, **options):
+    """
+    Worker task: analyze one capture and write its reports.
+
+    :param options: Keyword arguments of `analyze_file`.
+    :return: Statistics of the capture with its 'reports', or a dict with 'path' and 'error' if it failed.
+    """
+    try:
+        stats, peaks, coincidences = analyze_file(path, **options)
+        stats['reports'] = write_reports(stats, peaks, coincidences, stem, output_dir, formats)
+        return stats
+    except Exception as e:
+        logging.error(f"Error analyzing {path}: {e}")
+        return {'path': path, 'error': str(e)}
+
+
+def run_batch(paths, output_dir, workers=None, formats=REPORT_FORMATS, **options):
+    """
+    Analyze captures concurrently, one file per worker process, and write per-file reports plus
+    `summary.json` with the aggregate.
+
+    :param paths: Capture files.
+    :param output_dir: Report directory (created if missing).
+    :param workers: Number of worker processes (default: CPU count); 1 runs in this process.
+    :param formats: Per-file report formats, see `write_reports`.
+    :param options: Keyword arguments of `analyze_file`.
+    :return: Summary dict: 'files', 'failed', 'samples', 'duration_s', 'peaks' per channel name,
+             'seconds', 'files_per_s', 'samples_per_s' and the per-file 'results'.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = report_names(paths)
+    workers = min(workers or os.cpu_count(), max(len(paths), 1))
+    start_time = time.perf_counter()
+
+    def report(stats):
+        if 'error' in stats:
+            return
+        peaks = sum(stats['peaks'].values())
+        logging.info(f"{stats['path']}: {stats['samples']} samples, {peaks} peaks in {stats['seconds']:.2f} s "
+                     f"({stats['samples_per_s'] / 1e6:.1f} MS/s)")
+
+    results = []
+    if workers == 1:
+        for path in paths:
+            results.append(process_file(path, names[path], output_dir, formats, **options))
+            report(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_file, path, names[path], output_dir, formats, **options) for path in paths]
+            for future in as_completed(futures):
+                results.append(future.result())
+                report(results[-1])
+
+    seconds = time.perf_counter() - start_time
+    done = [stats for stats in results if 'error' not in stats]
+    totals = {}
+    for stats in done:
+        for name, count in stats['peaks'].items():
+            totals[name] = totals.get(name, 0) + count
+    samples = sum(stats['samples'] for stats in done)
+    summary = {
+        'files': len(results),
+        'failed': len(results) - len(done),
+        'samples': samples,
+        'duration_s': sum(stats['duration_s'] for stats in done),
+        'peaks': totals,
+        'workers': workers,
+        'seconds': seconds,
+        'files_per_s': len(results) / seconds if seconds > 0 else 0.0,
+        'samples_per_s': samples / seconds if seconds > 0 else 0.0,
+        'options': options,
+        'results': sorted(results, key=lambda stats: stats['path']),
+    }
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Detect peaks in many captures without the GUI and write reports.")
+    parser.add_argument('inputs', nargs='+', help="Sample store (.bin) or CSV files, glob patterns or directories")
+    parser.add_argument('--output-dir', default='reports', help="Directory for the reports and summary.json")
+    parser.add_argument('--format', default=','.join(REPORT_FORMATS),
+                        help="Comma-separated per-file report formats (csv, json)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Files analyzed in parallel")
+    parser.add_argument('--threshold', type=float, default=850)
+    parser.add_argument('--min-duration', type=int, default=50)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--sample-rate', type=float, default=SAMPLE_RATE, help="Sample rate of CSV captures in Hz")
+    parser.add_argument('--tolerance', type=int, default=COINCIDENCE_TOLERANCE,
+                        help="Maximum delay in samples between coincident peaks of two channels")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    formats = [f for f in args.format.split(',') if f]
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        parser.error(f"Unknown report format: {', '.join(sorted(unknown))}")
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        logging.error("No capture files found")
+        sys.exit(1)
+
+    summary = run_batch(paths, args.output_dir, args.workers, formats, threshold=args.threshold,
+                        min_duration=args.min_duration, chunk_size=args.chunk_size, sample_rate=args.sample_rate,
+                        tolerance=args.tolerance)
+    logging.info(f"{summary['files']} files ({summary['failed']} failed), {summary['samples']} samples, "
+                 f"{sum(summary['peaks'].values())} peaks in {summary['seconds']:.2f} s: "
+                 f"{summary['files_per_s']:.2f} files/s, {summary['samples_per_s'] / 1e6:.1f} MS/s")
+    sys.exit(1 if summary['failed'] else 0)
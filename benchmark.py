@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import plotly
+import plotly.graph_objs as go
+
+from data_processing import (process_chunk, detect_significant_peaks, detect_channel_peaks, create_plotly_traces,
+                             StreamingPeakDetector, decimate_minmax, typed_array)
+from ingest import ingest_csv
+from sample_store import SampleStore
+from synthetic import write_capture_csv, write_capture_store
+from utils import CHUNK_SIZE, SAMPLE_RATE, DISPLAY_WIDTH
+
+SIZES = {
+    'chunk': CHUNK_SIZE,
+    '10s': 10 * SAMPLE_RATE,
+    '1min': 60 * SAMPLE_RATE,
+    '10min': 600 * SAMPLE_RATE,
+    '1h': 3600 * SAMPLE_RATE,
+}
+IN_MEMORY_MAX_SAMPLES = 60 * SAMPLE_RATE  # Whole-signal benchmarks above this would mostly measure swapping
+FULL_FIGURE_MAX_SAMPLES = 10 * SAMPLE_RATE  # Full-resolution figures as JSON lists get slow beyond this
+CSV_MAX_SAMPLES = 600 * SAMPLE_RATE  # Text captures grow ~10 bytes per sample
+
+
+def _time(function, repeat):
+    """Best and mean wall time of `function()` over `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+
+def _json_bytes(obj):
+    return len(json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def _typed_json_bytes(obj):
+    return len(json.dumps(obj, default=typed_array, separators=(',', ':')))
+
+
+def _list_figure(x, y):
+    """Figure with the signal traces as plain JSON lists, the encoding before binary typed arrays."""
+    return go.Figure([go.Scatter(x=x[:, i].tolist(), y=y[:, i].tolist()) for i in range(y.shape[1])])
+
+
+def run_suite(size_names, repeat=3, threshold=850, workdir=None, only=None, channels=2):
+    """
+    Run every benchmark at each size on the same synthetic capture.
+
+    :param size_names: Keys of SIZES.
+    :param repeat: Runs per benchmark; the best and mean time are reported.
+    :param threshold: Peak detection threshold.
+    :param workdir: Directory for generated capture files (default: a temporary directory).
+    :param only: Optional set of benchmark names to run.
+    :param channels: Number of channels of the synthetic capture.
+    :return: List of result dicts.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size_name in size_names:
+            n_samples = SIZES[size_name]
+            store_path = os.path.join(tmp, f'{size_name}.bin')
+            write_capture_store(store_path, n_samples, channels=channels)
+            store = SampleStore(store_path)
+
+            def record(name, function, samples=n_samples, **extra):
+                if only and name not in only:
+                    return
+                best, mean = _time(function, repeat)
+                row = {'name': name, 'size': size_name, 'channels': channels, 'samples': samples, 'repeat': repeat,
+                       'best_s': best,
+                       'mean_s': mean, 'samples_per_s': samples / best if best > 0 else None}
+                row.update(extra)
+                results.append(row)
+                print(f"{name:>31} {size_name:>6}: best {best * 1000:9.2f} ms, mean {mean * 1000:9.2f} ms, "
+                      f"{samples / best / 1e6 if best > 0 else 0:8.1f} MS/s"
+                      + (f", {extra['payload_bytes'] / 1e3:.1f} kB" if 'payload_bytes' in extra else ""))
+                return row
+
+            # Streaming pass over the store, as the processing thread does it
+            def stream():
+                detector = StreamingPeakDetector(threshold, n_channels=channels)
+                for i in range(0, len(store), CHUNK_SIZE):
+                    process_chunk(store.data[i:i + CHUNK_SIZE], threshold, detector=detector,
+                                  final=i + CHUNK_SIZE >= len(store), channels=store.channel_names)
+            record('process_stream', stream)
+
+            if n_samples <= IN_MEMORY_MAX_SAMPLES:
+                data = np.array(store.data)
+                names = store.channel_names
+                peaks = detect_channel_peaks(data, threshold)
+
+                record('detect_significant_peaks', lambda: detect_significant_peaks(data[:, 0], threshold))
+                record('detect_channel_peaks', lambda: detect_channel_peaks(data, threshold))
+                record('process_chunk', lambda: process_chunk(data, threshold, channels=names))
+                record('process_chunk_downsample', lambda: process_chunk(data, threshold, downsample=True,
+                                                                         channels=names))
+                record('create_plotly_traces', lambda: create_plotly_traces(data, peaks, names,
+                                                                            max_points=2 * DISPLAY_WIDTH))
+
+                # Figure payloads as binary typed arrays (int16 samples, int32 indices, x0/dx for a regular
+                # x-axis) against the same traces as JSON lists
+                figure = go.Figure(data=create_plotly_traces(data, peaks, names, max_points=2 * DISPLAY_WIDTH))
+                record('figure_serialization', figure.to_json, payload_bytes=len(figure.to_json()))
+                x, y = decimate_minmax(data, 2 * DISPLAY_WIDTH)
+                list_figure = _list_figure(x, y)
+                record('figure_serialization_lists', list_figure.to_json, payload_bytes=len(list_figure.to_json()))
+
+                if n_samples <= FULL_FIGURE_MAX_SAMPLES:
+                    figure = go.Figure(data=create_plotly_traces(data, peaks, names))
+                    record('full_figure_serialization', figure.to_json, payload_bytes=len(figure.to_json()))
+                    list_figure = _list_figure(np.broadcast_to(np.arange(n_samples)[:, None], data.shape), data)
+                    record('full_figure_serialization_lists', list_figure.to_json,
+                           payload_bytes=len(list_figure.to_json()))
+
+                # One live frame: a decimated chunk with times in seconds, as it is pushed (float32 times and
+                # int16 samples as typed arrays) and as it is polled (extendData, JSON lists)
+                idx, values = decimate_minmax(data[:CHUNK_SIZE], 2 * DISPLAY_WIDTH)
+                times = idx / SAMPLE_RATE
+                frame = {'x': list(times.T.astype(np.float32)), 'y': list(values.T)}
+                frame_samples = idx.size
+                record('frame_serialization', lambda: _typed_json_bytes(frame), samples=frame_samples,
+                       payload_bytes=_typed_json_bytes(frame))
+                frame = {'x': list(times.T), 'y': list(values.T)}
+                record('frame_serialization_lists', lambda: _json_bytes(frame), samples=frame_samples,
+                       payload_bytes=_json_bytes(frame))
+
+            if n_samples <= CSV_MAX_SAMPLES and (not only or 'ingest_csv' in only):
+                csv_path = os.path.join(tmp, f'{size_name}.csv')
+                write_capture_csv(csv_path, n_samples, channels=channels)
+                out_path = os.path.join(tmp, f'{size_name}_ingested.bin')
+                row = record('ingest_csv', lambda: ingest_csv(csv_path, out_path, SAMPLE_RATE),
+                             file_bytes=os.path.getsize(csv_path))
+                row['mb_per_s'] = row['file_bytes'] / 1e6 / row['best_s']
+                os.remove(csv_path)
+                os.remove(out_path)
+
+            del store
+            os.remove(store_path)
+    return results
+
+
+def compare(results, baseline):
+    """Print the speed ratio of each benchmark against a previous JSON report."""
+    previous = {(row['name'], row['size']): row for row in baseline['results']}
+    for row in results:
+        old = previous.get((row['name'], row['size']))
+        if old:
+            print(f"{row['name']:>31} {row['size']:>6}: {old['best_s'] / row['best_s']:.2f}x vs. baseline")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ADC analysis pipeline on synthetic captures.")
+    parser.add_argument('--sizes', default='chunk,10s,1min', help=f"Comma-separated sizes from {', '.join(SIZES)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=850)
+    parser.add_argument('--channels', type=int, default=2, help="Channels of the synthetic capture")
+    parser.add_argument('--only', help="Comma-separated benchmark names to run")
+    parser.add_argument('--workdir', help="Directory for temporary capture files")
+    parser.add_argument('--output', default='benchmark.json', help="JSON report path")
+    parser.add_argument('--compare', help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes.split(','), args.repeat, args.threshold, args.workdir,
+                        set(args.only.split(',')) if args.only else None, args.channels)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
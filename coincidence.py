@@ -0,0 +1,152 @@
+import numpy as np
+
+from utils import COINCIDENCE_TOLERANCE, COINCIDENCE_MAX_BINS
+
+
+def match_coincidences(reference, other, tolerance=COINCIDENCE_TOLERANCE):
+    """
+    Pair the peaks of two channels that lie within `tolerance` samples of each other.
+
+    One merge pass over both sorted index arrays: the side that is behind by more than the tolerance
+    advances, otherwise the two current peaks form a pair. Pairing the earliest free peaks first
+    finds as many pairs as any one-to-one assignment can, in O(n log n) with the sorts.
+
+    :param reference: Global sample indices of the reference channel's peaks.
+    :param other: Global sample indices of the other channel's peaks.
+    :param tolerance: Maximum |delay| in samples.
+    :return: Tuple (reference_index, other_index) of positions in `reference` and `other` of the matched
+             pairs, in reference time order. The delay of a pair is other - reference.
+    """
+    reference = np.asarray(reference, dtype=np.int64)
+    other = np.asarray(other, dtype=np.int64)
+    reference_order = np.argsort(reference, kind='stable')
+    other_order = np.argsort(other, kind='stable')
+    r, o = reference[reference_order].tolist(), other[other_order].tolist()
+
+    reference_index, other_index = [], []
+    i = j = 0
+    while i < len(r) and j < len(o):
+        if o[j] < r[i] - tolerance:
+            j += 1  # Too early for this and every later reference peak
+        elif o[j] > r[i] + tolerance:
+            i += 1  # No other peak left close enough
+        else:
+            reference_index.append(i)
+            other_index.append(j)
+            i += 1
+            j += 1
+    return (reference_order[np.array(reference_index, dtype=np.int64)],
+            other_order[np.array(other_index, dtype=np.int64)])
+
+
+class CoincidenceMatcher:
+    """
+    Streaming coincidence matching between a reference channel and every other channel.
+
+    Peaks are fed per chunk as the StreamingPeakDetector reports them (a long run may report its
+    peak after later, shorter ones). A peak stays pending until no peak that could still arrive can
+    lie within the tolerance: pairs below `horizon - tolerance` are final, unmatched peaks below
+    `horizon - 2 * tolerance` are counted as unmatched. Totals and a delay histogram are kept
+    instead of every pair, so memory does not grow with the stream.
+    """
+
+    def __init__(self, channels, tolerance=COINCIDENCE_TOLERANCE, reference=0, max_bins=COINCIDENCE_MAX_BINS):
+        """
+        :param channels: Channel names, in detector order.
+        :param tolerance: Maximum |delay| in samples of a coincidence.
+        :param reference: Index of the reference channel.
+        :param max_bins: Maximum number of delay histogram bins.
+        """
+        self.channels = list(channels)
+        self.tolerance = int(tolerance)
+        self.reference = reference
+        self.others = [c for c in range(len(self.channels)) if c != reference]
+        self.bin_width = max(1, -(-(2 * self.tolerance + 1) // max_bins))  # Whole samples per bin
+        self.n_bins = 2 * self.tolerance // self.bin_width + 1
+        self.reset()
+
+    def reset(self):
+        """Forget all peaks and totals."""
+        empty = np.empty(0, dtype=np.int64)
+        # Per other channel: pending reference and other peaks, and running totals
+        self.pending = {c: (empty, empty) for c in self.others}
+        self.matched = {c: 0 for c in self.others}
+        self.unmatched_reference = {c: 0 for c in self.others}
+        self.unmatched_other = {c: 0 for c in self.others}
+        self.delay_sum = {c: 0.0 for c in self.others}
+        self.delay_sq_sum = {c: 0.0 for c in self.others}
+        self.delay_min = {c: None for c in self.others}
+        self.delay_max = {c: None for c in self.others}
+        self.histogram = {c: np.zeros(self.n_bins, dtype=np.int64) for c in self.others}
+
+    def update(self, peaks, horizon=None):
+        """
+        Add the peaks of the next chunk and count the coincidences that became final.
+
+        :param peaks: List of arrays of global peak indices, one per channel.
+        :param horizon: Global index before which no further peaks will be reported (see
+                        `StreamingPeakDetector.horizon`); None when the stream has ended.
+        :return: Dict of other channel name -> (reference samples, other samples) of the pairs made final.
+        """
+        pair_cutoff = np.inf if horizon is None else horizon - self.tolerance
+        unmatched_cutoff = np.inf if horizon is None else horizon - 2 * self.tolerance
+        new_reference = np.asarray(peaks[self.reference], dtype=np.int64)
+
+        final = {}
+        for c in self.others:
+            reference, other = self.pending[c]
+            reference = np.sort(np.concatenate((reference, new_reference)))
+            other = np.sort(np.concatenate((other, np.asarray(peaks[c], dtype=np.int64))))
+
+            reference_index, other_index = match_coincidences(reference, other, self.tolerance)
+            done = (reference[reference_index] < pair_cutoff) & (other[other_index] < pair_cutoff)
+            reference_index, other_index = reference_index[done], other_index[done]
+            pairs = reference[reference_index], other[other_index]
+            self._count(c, pairs[1] - pairs[0])
+            final[self.channels[c]] = pairs
+
+            # Matched peaks are done; unmatched ones far enough back can no longer find a partner
+            reference = np.delete(reference, reference_index)
+            other = np.delete(other, other_index)
+            self.unmatched_reference[c] += int(np.count_nonzero(reference < unmatched_cutoff))
+            self.unmatched_other[c] += int(np.count_nonzero(other < unmatched_cutoff))
+            self.pending[c] = reference[reference >= unmatched_cutoff], other[other >= unmatched_cutoff]
+        return final
+
+    def _count(self, c, delays):
+        if len(delays) == 0:
+            return
+        self.matched[c] += len(delays)
+        self.delay_sum[c] += float(delays.sum())
+        self.delay_sq_sum[c] += float(np.square(delays, dtype=np.float64).sum())
+        low, high = int(delays.min()), int(delays.max())
+        self.delay_min[c] = low if self.delay_min[c] is None else min(self.delay_min[c], low)
+        self.delay_max[c] = high if self.delay_max[c] is None else max(self.delay_max[c], high)
+        self.histogram[c] += np.bincount((delays + self.tolerance) // self.bin_width, minlength=self.n_bins)
+
+    def bin_centers(self):
+        """Delay at the center of every histogram bin, in samples."""
+        return -self.tolerance + self.bin_width * np.arange(self.n_bins) + (self.bin_width - 1) / 2
+
+    def summary(self, sample_rate):
+        """
+        Coincidence statistics of every channel pair so far.
+
+        :param sample_rate: Sample rate in Hz, for delays in seconds.
+        :return: List of dicts with 'reference', 'other', 'matched', 'unmatched_reference',
+                 'unmatched_other', and 'delay_mean_s', 'delay_std_s', 'delay_min_s', 'delay_max_s'
+                 (None without matches).
+        """
+        rows = []
+        for c in self.others:
+            n = self.matched[c]
+            row = {'reference': self.channels[self.reference], 'other': self.channels[c], 'matched': n,
+                   'unmatched_reference': self.unmatched_reference[c], 'unmatched_other': self.unmatched_other[c],
+                   'delay_mean_s': None, 'delay_std_s': None, 'delay_min_s': None, 'delay_max_s': None}
+            if n:
+                mean = self.delay_sum[c] / n
+                row.update(delay_mean_s=mean / sample_rate,
+                           delay_std_s=max(self.delay_sq_sum[c] / n - mean ** 2, 0.0) ** 0.5 / sample_rate,
+                           delay_min_s=self.delay_min[c] / sample_rate, delay_max_s=self.delay_max[c] / sample_rate)
+            rows.append(row)
+        return rows
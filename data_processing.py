@@ -1,44 +1,135 @@
+import base64
 import numpy as np
 import logging
-import plotly.graph_objs as go
 
-def process_chunk(chunk_data, threshold, downsample=False):
+from utils import DISPLAY_WIDTH, CHANNEL_COLORS
+from metrics import metrics
+
+TYPED_ARRAY_TYPES = ('i1', 'u1', 'i2', 'u2', 'i4', 'u4', 'f4', 'f8')  # Array types plotly.js decodes
+
+def process_chunk(signals, threshold, downsample=False, detector=None, final=False, min_duration=50, indexes=None,
+                  channels=None):
+    """
+    Detect significant peaks in every channel of a chunk.
+
+    :param signals: (samples, channels) array, or a DataFrame (or mapping) of channel columns.
+    :param threshold: The threshold value to detect peaks.
+    :param downsample: Also return min/max decimated display series ('display').
+                       Detection always runs on the full-resolution signals.
+    :param detector: Optional StreamingPeakDetector over the same channels. When given, runs are carried
+                     across chunk boundaries and peak indices are global sample positions.
+    :param final: Whether this is the last chunk of the stream (closes runs still open at its end).
+    :param min_duration: Minimum run length of a peak, in samples (the detector carries its own).
+    :param indexes: Optional dict of ThresholdIndex per channel name built over this same data; used
+                    instead of detection when the threshold is indexed.
+    :param channels: Channel names of the columns (default: the DataFrame columns, or adc1, adc2, ...).
+    :return: Dict with signals, peak indices and peak summaries, or None on error.
+    """
     try:
-        adc1_signal = chunk_data['adc1'].values
-        adc2_signal = chunk_data['adc2'].values
-        if downsample:
-            # Downsample the data
-            adc1_signal = adc1_signal[::100]
-            adc2_signal = adc2_signal[::100]
-
-        adc1_peaks = detect_significant_peaks(adc1_signal, threshold)
-        adc2_peaks = detect_significant_peaks(adc2_signal, threshold)
-
-        adc1_peak_summary = ""
-        adc2_peak_summary = ""
-
-        if len(adc1_peaks) > 0:
-            adc1_peak_values = adc1_signal[adc1_peaks]
-            adc1_peak_summary = f"ADC1 significant peaks found: {len(adc1_peaks)}, Mean peak value: {np.mean(adc1_peak_values):.2f}"
-            logging.debug(adc1_peak_summary)
-
-        if len(adc2_peaks) > 0:
-            adc2_peak_values = adc2_signal[adc2_peaks]
-            adc2_peak_summary = f"ADC2 significant peaks found: {len(adc2_peaks)}, Mean peak value: {np.mean(adc2_peak_values):.2f}"
-            logging.debug(adc2_peak_summary)
-
-        return {
-            'adc1': adc1_signal,
-            'adc2': adc2_signal,
-            'adc1_peaks': adc1_peaks,
-            'adc2_peaks': adc2_peaks,
-            'adc1_peak_summary': adc1_peak_summary,
-            'adc2_peak_summary': adc2_peak_summary
-        }
+        signals, channels = as_channels(signals, channels)
+        widths = horizon = None  # Run lengths and the horizon are only tracked by the streaming detector
+        with metrics.timed('detect', len(signals)):
+            if indexes is not None and all(threshold in indexes[name].runs for name in channels):
+                start = 0
+                peaks = [indexes[name].peaks(threshold) for name in channels]
+            elif detector is None:
+                start = 0
+                peaks = detect_channel_peaks(signals, threshold, min_duration)
+            else:
+                start = detector.position
+                peaks = detector.update(signals, final)
+                widths = detector.widths
+                horizon = None if final else detector.horizon
+
+        return build_result(signals, peaks, start, downsample, widths, channels, horizon)
     except Exception as e:
         logging.error(f"Error in peak detection: {e}")
         return None
 
+def as_channels(signals, channels=None):
+    """
+    Normalize chunk data to a (samples, channels) array and its channel names.
+
+    :param signals: 2-D array, 1-D array (one channel), or DataFrame/mapping of channel columns.
+    :param channels: Channel names; required to pick columns from a mapping in a given order.
+    :return: Tuple (signals, channels).
+    """
+    if hasattr(signals, 'keys'):
+        channels = list(channels or signals.keys())
+        return np.column_stack([np.asarray(signals[name]) for name in channels]), channels
+    signals = np.asarray(signals)
+    if signals.ndim == 1:
+        signals = signals[:, None]
+    if channels is None:
+        channels = [f'adc{i + 1}' for i in range(signals.shape[1])]
+    return signals, list(channels)
+
+def build_result(signals, peaks, start=0, downsample=False, widths=None, channels=None, horizon=None):
+    """
+    Assemble the result dict of a processed chunk from its signals and detected peaks.
+
+    :param signals: (samples, channels) array.
+    :param peaks: List of peak index arrays, one per channel.
+    :param start: Global index of the first sample of the chunk (peak indices may be global).
+    :param downsample: Also add min/max decimated display series.
+    :param widths: Optional list of run lengths per channel, added as 'peak_widths'.
+    :param channels: Channel names (default: adc1, adc2, ...).
+    :param horizon: Optional global index before which the stream reports no more peaks, added as 'horizon'
+                    (see `StreamingPeakDetector.horizon`); absent once all peaks up to the chunk end are known.
+    :return: Dict with 'start', 'channels', 'signals', 'peaks' and 'peak_summary' (one string per channel).
+    """
+    signals, channels = as_channels(signals, channels)
+    counts, means = peak_stats(signals, peaks, start)
+
+    peak_summary = []
+    for name, count, mean in zip(channels, counts, means):
+        summary = f"{name.upper()} significant peaks found: {count}, Mean peak value: {mean:.2f}" if count else ""
+        if summary:
+            logging.debug(summary)
+        peak_summary.append(summary)
+
+    result = {
+        'start': start,
+        'channels': channels,
+        'signals': signals,
+        'peaks': peaks,
+        'peak_summary': peak_summary
+    }
+    if widths is not None:
+        result['peak_widths'] = widths
+    if horizon is not None:
+        result['horizon'] = horizon
+    if downsample:
+        # Decimate for display only, keeping the extremes of every pixel column
+        result['display'] = decimate_minmax(signals, 2 * DISPLAY_WIDTH)
+    return result
+
+def peak_stats(signals, peaks, start=0):
+    """
+    Peak count and mean peak value of every channel, in one pass over all peaks.
+
+    Only peaks inside this chunk have a value (a peak of a run that began in an earlier chunk may lie
+    before `start`); a channel without any has a NaN mean.
+
+    :return: Tuple (counts, means) of arrays with one entry per channel.
+    """
+    n_channels = signals.shape[1]
+    counts = np.array([len(p) for p in peaks], dtype=np.int64)
+    channel = np.repeat(np.arange(n_channels), counts)
+    local = np.concatenate(peaks).astype(np.int64) - start if counts.sum() else np.empty(0, dtype=np.int64)
+    inside = (local >= 0) & (local < len(signals))
+    values = signals[local[inside], channel[inside]]
+    totals = np.bincount(channel[inside], weights=values, minlength=n_channels)
+    found = np.bincount(channel[inside], minlength=n_channels)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(found > 0, totals / found, np.nan)
+    return counts, means
+
+def split_channels(channel, values, n_channels):
+    """Split `values` sorted by `channel` into one array per channel."""
+    bounds = np.searchsorted(channel, np.arange(n_channels + 1))
+    return [values[bounds[i]:bounds[i + 1]] for i in range(n_channels)]
+
 def detect_significant_peaks(signal_data, threshold=850, min_duration=50):
     """
     Detect peaks where the signal goes above the threshold for a long enough duration.
@@ -48,77 +139,367 @@ def detect_significant_peaks(signal_data, threshold=850, min_duration=50):
     :param min_duration: Minimum number of consecutive samples above the threshold to consider it a peak.
     :return: Array of peak indices.
     """
-    above_threshold = signal_data > threshold  # Boolean array where signal is above threshold
-    peaks = []
-    start_idx = None  # To store the starting index of a potential peak
+    above_threshold = np.asarray(signal_data) > threshold  # Boolean array where signal is above threshold
+    starts, ends = find_runs(above_threshold)
 
-    for i, is_above in enumerate(above_threshold):
-        if is_above:
-            if start_idx is None:
-                start_idx = i  # Start of a potential peak
+    # Keep only runs that are long enough and store the middle point of each.
+    # A run still open at the end of the signal ends at len(signal_data).
+    long_enough = ends - starts >= min_duration
+    return (starts[long_enough] + ends[long_enough]) // 2
+
+def detect_channel_peaks(signals, threshold=850, min_duration=50):
+    """
+    `detect_significant_peaks` for every column of a (samples, channels) array in one pass.
+
+    :return: List of peak index arrays, one per channel.
+    """
+    signals = np.asarray(signals)
+    channel, starts, ends = find_channel_runs(signals > threshold)
+    long_enough = ends - starts >= min_duration
+    return split_channels(channel[long_enough], (starts[long_enough] + ends[long_enough]) // 2, signals.shape[1])
+
+def find_runs(mask):
+    """
+    Find runs of consecutive True values in a boolean array.
+
+    :param mask: 1-D boolean array.
+    :return: Tuple (starts, ends) of index arrays; each run covers mask[start:end].
+    """
+    # Pad with False on both sides so every run has a rising and a falling edge
+    padded = np.zeros(len(mask) + 2, dtype=np.int8)
+    padded[1:-1] = mask
+    edges = np.flatnonzero(np.diff(padded))
+    return edges[0::2], edges[1::2]
+
+def find_channel_runs(mask):
+    """
+    Find runs of consecutive True values in every column of a (samples, channels) boolean array.
+
+    The mask is transposed into one padded row per channel, so a single `nonzero` over the edges
+    finds the runs of all channels, ordered by channel and then by start.
+
+    :return: Tuple (channels, starts, ends) of index arrays; each run covers mask[start:end, channel].
+    """
+    padded = np.zeros((mask.shape[1], len(mask) + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask.T
+    channel, edges = np.nonzero(np.diff(padded, axis=1))
+    return channel[0::2], edges[0::2], edges[1::2]
+
+def typed_array(values, dtype=None):
+    """
+    Plotly.js typed array spec ({'dtype', 'bdata'}) of an array, for payloads Plotly does not encode itself
+    (extendData, Patch, pushed frames): the raw little-endian bytes in base64 instead of decimal text.
+
+    :param values: Array to encode.
+    :param dtype: Type to send it as (default: its own); plotly.js has no 64-bit integer arrays.
+    :return: Dict with 'dtype' (e.g. 'i2', 'f4') and 'bdata'.
+    """
+    values = np.ascontiguousarray(values, dtype=np.dtype(dtype or np.asarray(values).dtype).newbyteorder('<'))
+    code = f'{values.dtype.kind}{values.dtype.itemsize}'
+    if code not in TYPED_ARRAY_TYPES:
+        raise ValueError(f"No plotly.js typed array for {values.dtype}")
+    return {'dtype': code, 'bdata': base64.b64encode(values).decode('ascii')}
+
+def decimate_minmax(signal_data, max_points):
+    """
+    Peak-preserving decimation for display.
+
+    Splits the signal into max_points // 2 buckets and keeps the minimum and the maximum of each,
+    in time order, so narrow pulses stay visible however far the signal is reduced. A 2-D
+    (samples, channels) signal is decimated for all channels at once.
+
+    :param signal_data: 1-D signal or (samples, channels) array.
+    :param max_points: Maximum number of points to return (per channel).
+    :return: Tuple (indices, values) of the kept samples, shaped like the input (one column per channel).
+    """
+    signal_data = np.asarray(signal_data)
+    if signal_data.ndim == 1:
+        indices, values = decimate_minmax(signal_data[:, None], max_points)
+        return indices[:, 0], values[:, 0]
+
+    n, n_channels = signal_data.shape
+    n_buckets = max(1, max_points // 2)
+    if n <= max_points:
+        return np.broadcast_to(np.arange(n)[:, None], (n, n_channels)), signal_data
+
+    bucket = -(-n // n_buckets)  # Ceiling division
+    n_full = n // bucket
+    body = signal_data[:n_full * bucket].reshape(n_full, bucket, n_channels)
+    offsets = (np.arange(n_full) * bucket)[:, None]
+    idx_min = offsets + body.argmin(axis=1)
+    idx_max = offsets + body.argmax(axis=1)
+    if n_full * bucket < n:
+        # Shorter last bucket
+        tail = signal_data[n_full * bucket:]
+        idx_min = np.vstack((idx_min, n_full * bucket + tail.argmin(axis=0)))
+        idx_max = np.vstack((idx_max, n_full * bucket + tail.argmax(axis=0)))
+
+    indices = np.empty((2 * len(idx_min), n_channels), dtype=np.int64)
+    indices[0::2] = np.minimum(idx_min, idx_max)
+    indices[1::2] = np.maximum(idx_min, idx_max)
+    return indices, np.take_along_axis(signal_data, indices, axis=0)
+
+def peak_values(held, samples, channel):
+    """
+    Signal values at global sample indices.
+
+    :param held: (start, block) pairs of the samples at hand: global index of the first sample and a
+                 (samples, channels) array, e.g. the whole capture or the last chunks of a stream.
+    :param samples: Global sample indices.
+    :param channel: Channel column of each index.
+    :return: Float array of the values, NaN where no block holds the index.
+    """
+    values = np.full(len(samples), np.nan)
+    for start, block in held:
+        local = samples - start
+        inside = (local >= 0) & (local < len(block))
+        values[inside] = block[local[inside], channel[inside]]
+    return values
+
+class StreamingPeakDetector:
+    """
+    Peak detector for a stream of (samples, channels) chunks.
+
+    Keeps the runs that are still open at the end of a chunk, so a pulse straddling a chunk boundary
+    is counted once, with the same index a single pass over the whole signal would give. All
+    channels are handled together with array operations. Memory use does not depend on the length
+    of the stream.
+    """
+
+    def __init__(self, threshold=850, min_duration=50, n_channels=1):
+        self.threshold = threshold
+        self.min_duration = min_duration
+        self.n_channels = n_channels
+        self.reset()
+
+    def reset(self):
+        """Forget the stream and start again from sample 0."""
+        self.position = 0  # Global index of the next sample
+        # Global start index of the run still open at the end of the last chunk, per channel (-1: none)
+        self.open_start = np.full(self.n_channels, -1, dtype=np.int64)
+        self.widths = self._empty()  # Run lengths of the peaks returned by the last call, per channel
+
+    def _empty(self):
+        return [np.empty(0, dtype=np.int64) for _ in range(self.n_channels)]
+
+    @property
+    def horizon(self):
+        """Global index before which no further peak can be reported: the start of the earliest open run."""
+        open_starts = self.open_start[self.open_start >= 0]
+        return int(min(self.position, open_starts.min())) if len(open_starts) else self.position
+
+    def update(self, chunk, final=False):
+        """
+        Feed the next chunk of samples.
+
+        :param chunk: (samples, channels) array following the previously fed samples (1-D for one channel).
+        :param final: Whether this is the last chunk (closes runs still open at its end).
+        :return: List of arrays of global peak indices of runs that ended so far, one per channel.
+        """
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk[:, None]
+        channel, starts, ends = find_channel_runs(chunk > self.threshold)
+        return self.feed_runs(channel, starts, ends, len(chunk), final)
+
+    def feed_runs(self, channel, starts, ends, length, final=False):
+        """
+        Feed runs already found in the next chunk (e.g. by `find_channel_runs` in another process).
+
+        :param channel: Channel of each run; runs are ordered by channel, then by start.
+        :param starts: Chunk-local start indices of the runs above threshold.
+        :param ends: Chunk-local end indices (exclusive) of the runs.
+        :param length: Number of samples in the chunk.
+        :param final: Whether this is the last chunk of the stream.
+        :return: List of arrays of global peak indices of runs that ended so far, one per channel.
+        """
+        offset = self.position
+        channel = np.asarray(channel, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64) + offset
+        ends = np.asarray(ends, dtype=np.int64) + offset
+        self.position = offset + length
+
+        open_channels = np.flatnonzero(self.open_start >= 0)
+        if len(open_channels) > 0 and (length > 0 or final):
+            # An open run continues if its channel's first run in this chunk starts at the boundary
+            first = np.searchsorted(channel, open_channels)
+            has_run = first < len(channel)
+            continues = np.zeros(len(open_channels), dtype=bool)
+            continues[has_run] = ((channel[first[has_run]] == open_channels[has_run]) &
+                                  (starts[first[has_run]] == offset))
+            starts[first[continues]] = self.open_start[open_channels[continues]]
+
+            # The other open runs ended exactly at the chunk boundary
+            closed = open_channels[~continues]
+            order = np.argsort(np.concatenate((closed, channel)), kind='stable')
+            channel = np.concatenate((closed, channel))[order]
+            starts = np.concatenate((self.open_start[closed], starts))[order]
+            ends = np.concatenate((np.full(len(closed), offset), ends))[order]
+            self.open_start[open_channels] = -1
+
+        if not final and len(channel) > 0:
+            # The last run of a channel reaching the end of the chunk may continue in the next one
+            last = np.append(channel[1:] != channel[:-1], True)
+            still_open = last & (ends == self.position)
+            self.open_start[channel[still_open]] = starts[still_open]
+            channel, starts, ends = channel[~still_open], starts[~still_open], ends[~still_open]
+
+        long_enough = ends - starts >= self.min_duration
+        channel, starts, ends = channel[long_enough], starts[long_enough], ends[long_enough]
+        self.widths = split_channels(channel, ends - starts, self.n_channels)
+        return split_channels(channel, (starts + ends) // 2, self.n_channels)
+
+    def skip_to(self, position):
+        """
+        Samples are missing up to `position` (e.g. lost packets): close the open runs at the last
+        sample seen and continue the stream from `position`.
+
+        :return: List of arrays of global peak indices of the runs closed by the gap, one per channel.
+        """
+        if position < self.position:
+            raise ValueError(f"Cannot skip back from sample {self.position} to {position}")
+        if position == self.position:
+            self.widths = self._empty()
+            return self._empty()
+        empty = np.empty(0, dtype=np.int64)
+        peaks = self.feed_runs(empty, empty, empty, 0, final=True)
+        self.position = position
+        return peaks
+
+class ThresholdIndex:
+    """
+    Peaks of one signal for a fixed set of thresholds, built once per dataset in one pass.
+
+    A sample lies in a run of at least min_duration samples above t exactly when some window of
+    min_duration samples around it stays above t, i.e. when the opening of the signal (sliding
+    maximum of the sliding minimum, see `_opening`) exceeds t. Quantizing the opening to threshold
+    levels, every step up or down between levels starts or ends one long-enough run at each level
+    it crosses, so all levels come from one pass whose cost grows with the signal and the number of
+    runs found, not with the number of thresholds. Lookups are then a dict access.
+    """
+
+    def __init__(self, signal_data, thresholds, min_duration=50):
+        self.thresholds = np.unique(thresholds)
+        self.min_duration = min_duration
+        self.runs = {}  # threshold -> (starts, ends) of runs of at least min_duration samples
+
+        # Number of thresholds below the opening: above threshold k wherever the level exceeds k. The
+        # opening is flat over long stretches, so only the positions where it changes are quantized.
+        signal_data = np.asarray(signal_data)
+        opened = _opening(signal_data, max(min_duration, 1))
+        if opened is None:
+            segment_starts = np.empty(0, dtype=np.int64)
         else:
-            if start_idx is not None:
-                # Check if the duration of the peak is long enough
-                if i - start_idx >= min_duration:
-                    # Peak is valid, store the middle point of the peak
-                    peak_idx = (start_idx + i) // 2
-                    peaks.append(peak_idx)
-                start_idx = None  # Reset start index for the next potential peak
+            segment_starts = np.flatnonzero(np.r_[True, opened[1:] != opened[:-1]])
+        level = np.zeros(len(segment_starts) + 2, dtype=np.int64)
+        level[1:-1] = np.searchsorted(self.thresholds, opened[segment_starts] if len(segment_starts) else [])
+        boundaries = np.append(segment_starts, len(signal_data))
+
+        # A step from level a to b at a boundary starts (b > a) or ends (b < a) a run at levels a..b-1
+        step = np.diff(level)
+        changed = np.flatnonzero(step)
+        low = np.minimum(level[changed], level[changed + 1])
+        size = np.abs(step[changed])
+        k = np.repeat(low - np.cumsum(size) + size, size) + np.arange(size.sum())
+        position, rising = np.repeat(boundaries[changed], size), np.repeat(step[changed] > 0, size)
+
+        # Per level, starts and ends alternate in position order
+        order = np.lexsort((position, k))
+        k, position, rising = k[order], position[order], rising[order]
+        starts, ends, start_k = position[rising], position[~rising], k[rising]
+        bounds = np.searchsorted(start_k, np.arange(len(self.thresholds) + 1))
+        for i, threshold in enumerate(self.thresholds):
+            self.runs[threshold] = (starts[bounds[i]:bounds[i + 1]], ends[bounds[i]:bounds[i + 1]])
 
-    # Handle case where the signal remains above the threshold until the end
-    if start_idx is not None and len(signal_data) - start_idx >= min_duration:
-        peak_idx = (start_idx + len(signal_data)) // 2
-        peaks.append(peak_idx)
+        # Peak count per threshold, e.g. for a count vs. threshold curve
+        self.counts = np.diff(bounds)
 
-    return np.array(peaks)
+    def peaks(self, threshold):
+        """
+        Peak indices for an indexed threshold, same as `detect_significant_peaks`.
 
-def create_plotly_traces(adc1_signal, adc2_signal, adc1_peaks, adc2_peaks):
+        :return: Array of peak indices, or None if the threshold is not indexed.
+        """
+        runs = self.runs.get(threshold)
+        if runs is None:
+            return None
+        starts, ends = runs
+        return (starts + ends) // 2
+
+def _opening(signal_data, width):
+    """
+    Morphological opening of a 1-D signal with a flat window of `width` samples: at every sample, the
+    largest minimum of a window of `width` samples containing it. None if the signal is shorter.
+
+    Sliding minimum and maximum use the van Herk/Gil-Werman block prefix and suffix scans, a few
+    array passes whatever the width.
+    """
+    n = len(signal_data)
+    if n < width:
+        return None
+    eroded = _sliding(signal_data, width, np.minimum)  # eroded[j] = min(signal_data[j:j + width])
+    # Each sample's windows start at j in [i - width + 1, i]: pad so the same sliding scan applies
+    padded = np.concatenate((np.full(width - 1, eroded.min()), eroded, np.full(width - 1, eroded.min())))
+    return _sliding(padded, width, np.maximum)[:n]
+
+def _sliding(values, width, ufunc):
+    """`ufunc` reduction over every window of `width` consecutive values (len(values) - width + 1 results)."""
+    n = len(values)
+    n_blocks = -(-n // width)
+    fill = values.max() if ufunc is np.minimum else values.min()
+    blocks = np.full(n_blocks * width, fill, dtype=values.dtype)
+    blocks[:n] = values
+    blocks = blocks.reshape(n_blocks, width)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    # A window starting at j spans the suffix of j's block and the prefix up to j + width - 1
+    return ufunc(suffix[:n - width + 1], prefix[width - 1:n])
+
+def create_plotly_traces(signals, peaks, channels=None, max_points=None):
     """
     Create Plotly traces for ADC signals and their detected peaks.
 
-    :param adc1_signal: ADC1 signal data.
-    :param adc2_signal: ADC2 signal data.
-    :param adc1_peaks: Indices of detected peaks in ADC1 signal.
-    :param adc2_peaks: Indices of detected peaks in ADC2 signal.
-    :return: List of Plotly traces.
+    :param signals: (samples, channels) array.
+    :param peaks: List of peak index arrays, one per channel.
+    :param channels: Channel names, used for trace names (default: adc1, adc2, ...).
+    :param max_points: Optional limit of points per signal trace (min/max decimation, peaks are kept).
+    :return: List of Plotly traces, the signal traces first, then the peak traces.
     """
-    # Prepare time values based on the length of the signals
-    time_values = np.arange(len(adc1_signal))  # Assuming 1 sample per time unit for simplicity
+    with metrics.timed('traces', len(signals)):
+        return _create_plotly_traces(signals, peaks, channels, max_points)
+
+def _create_plotly_traces(signals, peaks, channels, max_points):
+    import plotly.graph_objs as go  # Only plotting needs Plotly; headless users (batch.py) skip the import
+    signals, channels = as_channels(signals, channels)
+
+    # Time values are sample indices: a regular grid is sent as x0/dx, decimation picks them per channel.
+    # Plotly sends NumPy arrays as binary typed arrays, so indices are narrowed to int32 and samples keep
+    # their (int16) store type.
+    if max_points is None or len(signals) <= max_points:
+        x, y = None, signals
+    else:
+        x, y = decimate_minmax(signals, max_points)
+        x = x.astype(np.int32)
 
     # Create traces
-    adc1_trace = go.Scattergl(
-        x=time_values,
-        y=adc1_signal,
-        mode='lines+markers',
-        name='ADC1 Signal',
-        line=dict(color='blue'),
-        marker=dict(size=5)
-    )
-
-    adc2_trace = go.Scattergl(
-        x=time_values,
-        y=adc2_signal,
-        mode='lines+markers',
-        name='ADC2 Signal',
-        line=dict(color='green'),
-        marker=dict(size=5)
-    )
-
-    # Create peak traces
-    adc1_peak_trace = go.Scatter(
-        x=adc1_peaks,
-        y=adc1_signal[adc1_peaks],
-        mode='markers',
-        name='ADC1 Peaks',
-        marker=dict(color='red', size=10, symbol='x')
-    )
-
-    adc2_peak_trace = go.Scatter(
-        x=adc2_peaks,
-        y=adc2_signal[adc2_peaks],
-        mode='markers',
-        name='ADC2 Peaks',
-        marker=dict(color='orange', size=10, symbol='x')
-    )
-
-    return [adc1_trace, adc2_trace, adc1_peak_trace, adc2_peak_trace]
+    signal_traces = []
+    peak_traces = []
+    for i, name in enumerate(channels):
+        color = CHANNEL_COLORS[i % len(CHANNEL_COLORS)]
+        signal_traces.append(go.Scattergl(
+            **(dict(x0=0, dx=1) if x is None else dict(x=x[:, i])),
+            y=y[:, i],
+            mode='lines+markers',
+            name=f'{name.upper()} Signal',
+            line=dict(color=color),
+            marker=dict(size=5)
+        ))
+        peak_traces.append(go.Scatter(
+            x=np.asarray(peaks[i], dtype=np.int32),
+            y=signals[peaks[i], i],
+            mode='markers',
+            name=f'{name.upper()} Peaks',
+            marker=dict(color=color, size=10, symbol='x')
+        ))
+
+    return signal_traces + peak_traces
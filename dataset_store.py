@@ -0,0 +1,148 @@
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from ingest import ingest_upload
+from result_cache import fingerprint
+from sample_store import SampleStore
+from tile_pyramid import open_pyramid, pyramid_path
+from data_processing import ThresholdIndex
+from metrics import metrics
+
+
+class Dataset:
+    """
+    One uploaded capture: its sample store file plus the per-dataset structures built from it.
+
+    The threshold index and tile pyramid are built on first use, once, even when several callbacks
+    ask for them at the same time.
+    """
+
+    def __init__(self, dataset_id, path, name=None):
+        self.id = dataset_id
+        self.path = path
+        self.name = name
+        self.store = SampleStore(path)
+        self.lock = threading.Lock()
+        self._indexes = None
+        self._pyramid = None
+
+    def threshold_indexes(self, thresholds, min_duration):
+        """ThresholdIndex per channel over the whole capture."""
+        with self.lock:
+            if self._indexes is None or self._indexes[0] != min_duration:
+                with metrics.timed('threshold_index', len(self.store)):
+                    indexes = {name: ThresholdIndex(self.store.channel(name), thresholds, min_duration)
+                               for name in self.store.channel_names}
+                self._indexes = (min_duration, indexes)
+            return self._indexes[1]
+
+    def pyramid(self):
+        """Min/max tile pyramid of the capture, built next to the sample store."""
+        with self.lock:
+            if self._pyramid is None:
+                with metrics.timed('pyramid', len(self.store)):
+                    self._pyramid = open_pyramid(self.path)
+            return self._pyramid
+
+    def files(self):
+        return [self.path, pyramid_path(self.path)]
+
+    def size(self):
+        """Bytes on disk."""
+        return sum(os.path.getsize(f) for f in self.files() if os.path.exists(f))
+
+
+class DatasetStore:
+    """
+    Server-side registry of uploaded datasets, keyed by a content hash.
+
+    An upload is ingested once into its own sample store file; callbacks then only pass the short
+    dataset ID around. Least recently used datasets are deleted when the files exceed `max_bytes`.
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        """
+        :param directory: Where dataset files are kept (default: a new temporary directory).
+        :param max_bytes: Disk budget for all datasets.
+        """
+        self.directory = directory or tempfile.mkdtemp(prefix='adc-datasets-')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.datasets = OrderedDict()  # id -> Dataset, least recently used first
+        self.ingesting = {}  # id -> Lock held while that upload is being ingested
+        self.evictions = 0
+        self.lock = threading.Lock()
+        metrics.gauge('adc_datasets', lambda: len(self.datasets), "Datasets held by the dataset store")
+        metrics.gauge('adc_dataset_store_bytes', self.total_bytes, "Disk used by the dataset store")
+
+    def add_upload(self, contents, sample_rate, name=None):
+        """
+        Register a dcc.Upload `contents` string, ingesting it unless the same data is already stored.
+
+        :return: Tuple (dataset ID, ingest stats or None if it was already stored).
+        """
+        dataset_id = fingerprint(contents)
+        with self.lock:
+            ingesting = self.ingesting.setdefault(dataset_id, threading.Lock())
+
+        # The same upload arriving twice at once is ingested by the first caller only
+        with ingesting:
+            with self.lock:
+                if dataset_id in self.datasets:
+                    self.datasets.move_to_end(dataset_id)
+                    return dataset_id, None
+
+            path = os.path.join(self.directory, f'{dataset_id}.bin')
+            try:
+                stats = ingest_upload(contents, path, sample_rate)
+                with self.lock:
+                    self.datasets[dataset_id] = Dataset(dataset_id, path, name)
+                    self._evict(keep=dataset_id)
+            except Exception:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
+            finally:
+                with self.lock:
+                    self.ingesting.pop(dataset_id, None)
+        return dataset_id, stats
+
+    def get(self, dataset_id):
+        """The Dataset for an ID, or None if it is unknown or was evicted."""
+        with self.lock:
+            dataset = self.datasets.get(dataset_id)
+            if dataset is not None:
+                self.datasets.move_to_end(dataset_id)
+            return dataset
+
+    def evict(self, keep=None):
+        """Enforce the disk budget, e.g. after a pyramid was added to dataset `keep`, which is never evicted."""
+        with self.lock:
+            self._evict(keep)
+
+    def _evict(self, keep=None):
+        sizes = {dataset_id: dataset.size() for dataset_id, dataset in self.datasets.items()}
+        total = sum(sizes.values())
+        for dataset_id in list(self.datasets):
+            if total <= self.max_bytes:
+                break
+            if dataset_id == keep:
+                continue
+            dataset = self.datasets.pop(dataset_id)
+            total -= sizes[dataset_id]
+            self.evictions += 1
+            # Open memory maps of the files stay valid until their users drop them
+            for f in dataset.files():
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.error(f"Error removing dataset file {f}: {e}")
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(dataset.size() for dataset in self.datasets.values())
@@ -1,24 +1,33 @@
-import base64
-import io
 import threading
-from queue import Queue
 import logging
-import pandas as pd
 import numpy as np
-from collections import deque
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.graph_objs as go
-
-from Animation import Animator
-from utils import CHUNK_SIZE, SAMPLE_RATE, DISPLAY_TIME, ANIMATION_SPEED
-from data_processing import process_chunk
+from dash.dependencies import Input, Output, State
+
+from Animation import (Animator, metrics_panel, history_update, coincidence_text, delay_histogram_figure,
+                       METRICS_STYLE)
+from plot_setup import setup_plot
+from utils import (CHUNK_SIZE, SAMPLE_RATE, DISPLAY_TIME, ANIMATION_SPEED, FRAME_QUEUE_SIZE, FRAME_QUEUE_POLICY,
+                   LIVE_HOST, LIVE_PORT, LIVE_PROTOCOL, EVENT_LOG_PATH, DATASET_DIR, DATASET_STORE_BYTES,
+                   DEFAULT_CHANNELS, CHANNEL_PREFIX, FRAME_TRANSPORT, COINCIDENCE_TOLERANCE)
+from data_processing import process_chunk, peak_values, StreamingPeakDetector
+from sample_store import SampleStore, DEFAULT_DTYPE
+from ring_buffer import RingBuffer
+from dataset_store import DatasetStore
+from parallel import analyze_store_parallel
+from frame_queue import FrameQueue
+from metrics import metrics, register_endpoints
+from live_source import LiveSource
+from event_log import PeakEventLog
+from frame_stream import register_frame_stream, stream_component, assets_ignore
+from coincidence import CoincidenceMatcher
 
 class DualADCSignalAnalyzer:
     def __init__(self):
-        self.app = dash.Dash(__name__)
+        self.app = dash.Dash(__name__, assets_ignore=assets_ignore(FRAME_TRANSPORT))
         self.app.title = "Dual ADC Signal Analyzer"
+        register_endpoints(self.app.server)
 
         # Initialize parameters
         self.chunk_size = CHUNK_SIZE
@@ -26,66 +35,103 @@ class DualADCSignalAnalyzer:
         self.display_time = DISPLAY_TIME
         self.display_points = int(self.display_time * self.sample_rate)
         self.binary_filepath = None
+        self.dataset_id = None
+        self.datasets = DatasetStore(DATASET_DIR, DATASET_STORE_BYTES)  # Uploads, one sample store file each
         self.animation_speed = ANIMATION_SPEED
+        self.frame_transport = FRAME_TRANSPORT  # 'push' sends frames as they are produced, 'poll' uses an interval
 
-        # Data buffers for both ADC channels
-        self.adc1_buffer = deque(maxlen=self.display_points)
-        self.adc2_buffer = deque(maxlen=self.display_points)
+        # Display window, one column per channel, with absolute sample indices
+        self.channel_names = list(DEFAULT_CHANNELS)
+        self.display_buffer = RingBuffer(self.display_points, channels=len(self.channel_names), dtype=DEFAULT_DTYPE)
+        self.figure_reset = False  # The figure was rebuilt for other channels and must be resent
 
         # Peak detection parameters
-        self.recent_adc1_peaks = []
-        self.recent_adc2_peaks = []
+        self.threshold = 850
+        self.min_duration = 50
+        self.event_log = PeakEventLog(EVENT_LOG_PATH)
+        self.coincidence_tolerance = COINCIDENCE_TOLERANCE  # Samples between paired peaks of two channels
 
-        # Threading control
+        # Threading control; workers > 1 analyzes chunks in a process pool
+        self.workers = 1
         self.stop_event = threading.Event()
-        self.data_queue = Queue()
+        self.data_queue = FrameQueue(FRAME_QUEUE_SIZE, FRAME_QUEUE_POLICY, self.display_points, self.stop_event)
+
+        # Live network source, replaces the file as input when started
+        self.live_source = None
+        self.live_detector = None
+        self.live_previous = None  # (first sample, block) of the last live chunk, for peak values
+        self.live_name = None  # Source address, recorded with every event log run
 
         # Statistics
-        self.adc1_peak_count = 0
-        self.adc2_peak_count = 0
+        self.peak_counts = np.zeros(len(self.channel_names), dtype=np.int64)
+        self.coincidences = CoincidenceMatcher(self.channel_names, self.coincidence_tolerance)
         self.processed_duration = 0
 
-        # Prepare layout for Dash app
-        self.create_layout()
+        metrics.gauge('adc_frame_queue_depth', self.data_queue.qsize, "Processed chunks waiting for display")
+        metrics.gauge('adc_display_lag_seconds', self.data_queue.lag, "Age of the oldest undisplayed chunk")
+        metrics.gauge('adc_live_samples_per_second', lambda: self.live_stat('samples_per_s'),
+                      "Sustained live input rate per channel")
+        metrics.gauge('adc_live_dropped_frames', lambda: self.live_stat('dropped_frames'),
+                      "Live frames lost, from sequence number gaps")
+        metrics.gauge('adc_live_bad_frames', lambda: self.live_stat('bad_frames'), "Malformed live frames")
+        metrics.gauge('adc_live_late_frames', lambda: self.live_stat('late_frames'),
+                      "Live frames dropped for arriving after later samples")
+        metrics.gauge('adc_live_restarts', lambda: self.live_stat('restarts'),
+                      "Live streams started over (TCP reconnections, sender restarts)")
+
+        # Prepare figure and layout for Dash app
+        setup_plot(self)
         self.animator = Animator(self)
+        if self.frame_transport == 'push':
+            register_frame_stream(self.app.server, self.animator)
+        self.create_layout()
 
     def create_layout(self):
         self.app.layout = html.Div([
             html.H1("Real-Time Dual ADC Signal Analyzer"),
-            dcc.Graph(id='live-graph'),
+            dcc.Graph(id='live-graph', figure=self.fig),
+            stream_component('live-graph') if self.frame_transport == 'push' else
             dcc.Interval(id='interval-component', interval=self.animation_speed, n_intervals=0),
             dcc.Upload(id='file-upload', children=html.Button('Upload CSV'), multiple=False),
             html.Button('Load File', id='load-button', n_clicks=0),
             html.Div(id='filename-label'),
+            html.Button('Start Live', id='live-button', n_clicks=0),
+            html.Div(id='live-status'),
+            html.Div(id='lag-output'),
+            html.Div(id='coincidence-output'),
+            dcc.Graph(id='delay-histogram'),
+            dcc.Graph(id='peak-history'),
+            dcc.Store(id='peak-history-shown'),
+            html.Div(id='metrics-output', style=METRICS_STYLE),
+            dcc.Interval(id='metrics-interval', interval=1000),
             html.Div(id='progress-output', style={'width': '100%', 'background-color': '#f3f3f3', 'border': '1px solid #ccc', 'border-radius': '5px'}),
             html.Div(id='progress-bar', style={'width': '0%', 'height': '20px', 'background-color': '#4caf50', 'border-radius': '5px'})
         ])
 
     def load_file(self, contents):
-        """Loads and converts a CSV file to binary format."""
+        """Streams an uploaded CSV file into its own sample store in the dataset store."""
         try:
+            self.binary_filepath = None
             if contents:
-                content_type, content_string = contents.split(',')
-                decoded = base64.b64decode(content_string)
-                df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-                if 'adc1' not in df.columns or 'adc2' not in df.columns:
-                    raise ValueError("CSV file must contain 'adc1' and 'adc2' columns")
-
-                # Convert to binary format and save
-                self.binary_filepath = "data.bin"  # Use a temp file path for demonstration
-                df.to_pickle(self.binary_filepath)
-
-                return f"Loaded: {self.binary_filepath.split('/')[-1]}"
+                # Decode and parse block by block, writing samples straight to the store
+                self.dataset_id, stats = self.datasets.add_upload(contents, self.sample_rate)
+                dataset = self.datasets.get(self.dataset_id)
+                self.binary_filepath = dataset.path
+
+                if stats is None:
+                    return f"Loaded: dataset {self.dataset_id[:8]} ({len(dataset.store)} samples, already stored)"
+                return f"Loaded: dataset {self.dataset_id[:8]} ({stats['rows']} samples, {stats['mb_per_s']:.1f} MB/s)"
             return "No file selected."
         except Exception as e:
             logging.error(f"Error loading file: {e}")
             return str(e)
 
-    def process_chunk(self, chunk_data, threshold, downsample):
+    def process_chunk(self, chunk_data, threshold, downsample, detector=None, final=False, indexes=None, channels=None):
         """Process a chunk of data with a given threshold."""
         try:
             # Call the standalone function if needed, or implement your logic
-            return process_chunk(chunk_data, threshold, downsample)  # Importing this from data_processing
+            return process_chunk(chunk_data, threshold, downsample, detector, final, self.min_duration, indexes,
+                                 channels)  # Importing this from data_processing
         except Exception as e:
             logging.error(f"Error processing chunk: {e}")
             return None
@@ -97,48 +143,117 @@ class DualADCSignalAnalyzer:
             if not self.binary_filepath:
                 raise ValueError("Binary file not found. Please load a file first.")
 
-            # Load binary data into a DataFrame
-            binary_data = pd.read_pickle(self.binary_filepath)
+            # Memory-map the sample store; chunks below are zero-copy views into it
+            store = SampleStore(self.binary_filepath)
+            self.sample_rate = store.sample_rate
+            self.event_log.new_run(self.sample_rate, self.binary_filepath)
+
+            if self.workers > 1:
+                self.process_data_parallel()
+                return
+
+            # The detector carries runs of all channels across chunk boundaries
+            detector = StreamingPeakDetector(self.threshold, self.min_duration, len(store.channel_names))
 
             # Process data in chunks
-            for i in range(0, len(binary_data), self.chunk_size):
+            for i in range(0, len(store), self.chunk_size):
                 if self.stop_event.is_set():
                     break
 
-                # Select the chunk and send to `process_chunk`
-                chunk = binary_data.iloc[i:i + self.chunk_size]
-                result = process_chunk(chunk)
+                # Select the chunk (a (samples, channels) view) and send to `process_chunk`
+                chunk = store.data[i:i + self.chunk_size]
+                final = i + self.chunk_size >= len(store)
+                result = self.process_chunk(chunk, self.threshold, False, detector, final, channels=store.channel_names)
 
                 if result is not None:
+                    self.log_peaks(result, [(0, store.data)])
+                    self.coincidences.update(result['peaks'], result.get('horizon'))
                     self.data_queue.put(result)
 
                 # Update progress
-                self.update_progress(i / len(binary_data) * 100)
+                self.update_progress(i / len(store) * 100)
 
         except Exception as e:
             logging.error(f"Error in data processing thread: {e}")
 
+    def process_data_parallel(self):
+        """Process binary data chunks in a process pool, queueing results in chunk order."""
+        store = SampleStore(self.binary_filepath)
+        results = analyze_store_parallel(self.binary_filepath, self.threshold, self.min_duration, self.chunk_size,
+                                         self.workers, self.stop_event)
+        for result in results:
+            self.log_peaks(result, [(0, store.data)])
+            self.coincidences.update(result['peaks'], result.get('horizon'))
+            self.data_queue.put(result)
+            self.update_progress(result['start'] / len(store) * 100)
+
+    def process_live_chunk(self, first_sample, block, gap):
+        """Detect peaks in a chunk received by the live source and queue it for display."""
+        # Sample indices went back: the sender started over
+        if first_sample < self.live_detector.position:
+            self.new_live_stream()
+
+        # Samples were lost before this chunk: close open runs and jump the detector ahead
+        closed_peaks = self.live_detector.skip_to(first_sample)
+        closed_widths = self.live_detector.widths
+
+        result = self.process_chunk(block, self.threshold, False, self.live_detector, channels=self.channel_names)
+        if result is not None:
+            if gap:
+                result['peaks'] = [np.concatenate(pair) for pair in zip(closed_peaks, result['peaks'])]
+                result['peak_widths'] = [np.concatenate(pair) for pair in zip(closed_widths, result['peak_widths'])]
+            # A peak may lie in the previous chunk (its run started there, or was closed by the gap)
+            self.log_peaks(result, [(first_sample, block)] + ([self.live_previous] if self.live_previous else []))
+            self.coincidences.update(result['peaks'], result.get('horizon'))
+            self.data_queue.put(result)
+            self.processed_duration += len(block) / self.sample_rate
+        self.live_previous = (first_sample, block)
+
+    def log_peaks(self, result, held):
+        """
+        Write every peak of a processed chunk to the event log, before the chunk is queued for display
+        (where it may be dropped or merged).
+
+        :param result: `process_chunk` result with global peak indices.
+        :param held: (start, block) pairs of the samples at hand, see `peak_values`; peaks outside them
+                     are logged without a value.
+        """
+        counts = [len(peaks) for peaks in result['peaks']]
+        if not sum(counts):
+            return
+        channel = np.repeat(np.arange(len(counts)), counts)
+        samples = np.concatenate(result['peaks'])
+        widths = np.concatenate(result['peak_widths']) if 'peak_widths' in result else None
+        self.event_log.append(np.asarray(result['channels'])[channel], samples, widths,
+                              peak_values(held, samples, channel))
+
+    def live_stat(self, name):
+        """One counter of the live source (0 when not running)."""
+        return self.live_source.stats()[name] if self.live_source is not None else 0
+
     def update_progress(self, value):
         """Update the progress value in the progress bar."""
         self.processed_duration += self.chunk_size / self.sample_rate
         # Here you could set the width of a progress bar in a callback if you had it as an Output
 
-    def update_graph(self, n):
-        """Update the graph with new data."""
-        if not self.data_queue.empty():
-            data = self.data_queue.get()
-            self.adc1_buffer.extend(data['adc1'][-self.display_points:])
-            self.adc2_buffer.extend(data['adc2'][-self.display_points:])
-
-
-            time_values = np.linspace(max(0, self.processed_duration - self.display_time), self.processed_duration, len(self.adc1_buffer))
-            adc1_trace = go.Scattergl(x=time_values, y=list(self.adc1_buffer), mode='lines', name='ADC1 Signal')
-            adc2_trace = go.Scattergl(x=time_values, y=list(self.adc2_buffer), mode='lines', name='ADC2 Signal')
-
-            # Create a figure and return it
-            fig = go.Figure(data=[adc1_trace, adc2_trace])
-            fig.update_layout(title="Real-Time ADC Signals", xaxis_title="Time (s)", yaxis_title="ADC Value")
-            return fig
+    def buffer_frame(self, data):
+        """Append a processed chunk to the display window."""
+        n = len(data['signals'])
+        self.display_buffer.extend(data['signals'], np.arange(data['start'], data['start'] + n))
+
+    def set_channels(self, channel_names, dtype=DEFAULT_DTYPE):
+        """
+        Size the display window and figure for a capture's channels (names, or a count for adc1, adc2, ...)
+        and sample type.
+        """
+        if isinstance(channel_names, int):
+            channel_names = [f'{CHANNEL_PREFIX}{i + 1}' for i in range(channel_names)]
+        if list(channel_names) == self.channel_names and np.dtype(dtype) == self.display_buffer.data.dtype:
+            return
+        self.channel_names = list(channel_names)
+        self.display_buffer = RingBuffer(self.display_points, channels=len(self.channel_names), dtype=dtype)
+        setup_plot(self)
+        self.figure_reset = True
 
     def start_analysis(self):
         """Start the analysis process."""
@@ -146,26 +261,101 @@ class DualADCSignalAnalyzer:
             raise ValueError("Please load a file first!")
 
         self.stop_event.clear()
-        self.adc1_peak_count = 0
-        self.adc2_peak_count = 0
+        store = SampleStore(self.binary_filepath)
+        self.set_channels(store.channel_names, store.dtype)
+        self.peak_counts = np.zeros(len(self.channel_names), dtype=np.int64)
+        self.coincidences = CoincidenceMatcher(self.channel_names, self.coincidence_tolerance)
         self.processed_duration = 0
+        self.display_buffer.clear()
+        self.data_queue.clear()
 
         # Start processing thread
         processing_thread = threading.Thread(target=self.process_data_thread)
         processing_thread.start()
 
+    def start_live(self, host=LIVE_HOST, port=LIVE_PORT, protocol=LIVE_PROTOCOL, channels=None):
+        """
+        Start analyzing frames received from a live ADC source (see simulator.py).
+
+        :param channels: Channel names or count of the source (default: the current ones).
+        """
+        self.stop_analysis()
+        self.stop_event.clear()
+        if channels is not None:
+            self.set_channels(channels)
+        self.live_name = f"{protocol}://{host}:{port}"
+        self.new_live_stream()
+        self.live_source = LiveSource(self.process_live_chunk, len(self.channel_names), host, port, protocol,
+                                      self.chunk_size, on_stream=self.new_live_stream)
+        self.live_source.start()
+        return f"Listening on {protocol}://{host}:{port}"
+
+    def new_live_stream(self):
+        """
+        Start over for a new live stream (a new TCP connection or a restarted sender), whose sample
+        indices start again: fresh detector, statistics and display, and a new event log run.
+        """
+        self.peak_counts = np.zeros(len(self.channel_names), dtype=np.int64)
+        self.coincidences = CoincidenceMatcher(self.channel_names, self.coincidence_tolerance)
+        self.processed_duration = 0
+        self.data_queue.clear()
+        self.display_buffer.clear()
+        self.figure_reset = True  # Clear the traces of the previous stream on screen
+
+        self.live_detector = StreamingPeakDetector(self.threshold, self.min_duration, len(self.channel_names))
+        self.live_previous = None
+        self.event_log.new_run(self.sample_rate, self.live_name)
+
     def stop_analysis(self):
         """Stop the analysis process."""
         self.stop_event.set()
+        if self.live_source is not None:
+            self.live_source.stop()
 
     def run(self):
         """Run the Dash app."""
+        if self.frame_transport == 'poll':
+            @self.app.callback(
+                Output('live-graph', 'extendData'),
+                Output('live-graph', 'figure'),
+                Input('interval-component', 'n_intervals')
+            )
+            def update_graph_live(n):
+                return self.animator.update_plot(n)
+
+        # Pushed frames do not pass through callbacks, so the lag is refreshed with the metrics
+        @self.app.callback(
+            Output('lag-output', 'children'),
+            Input('interval-component' if self.frame_transport == 'poll' else 'metrics-interval', 'n_intervals')
+        )
+        def update_lag(n):
+            return self.animator.lag_text()
+
+        @self.app.callback(
+            Output('metrics-output', 'children'),
+            Input('metrics-interval', 'n_intervals')
+        )
+        def update_metrics(n):
+            return metrics_panel()
+
+        @self.app.callback(
+            Output('peak-history', 'extendData'),
+            Output('peak-history', 'figure'),
+            Output('peak-history-shown', 'data'),
+            Input('metrics-interval', 'n_intervals'),
+            State('peak-history-shown', 'data')
+        )
+        def update_history(n, shown):
+            return history_update(self.event_log, self.channel_names, shown)
+
         @self.app.callback(
-            Output('live-graph', 'figure'),
-            Input('interval-component', 'n_intervals')
+            Output('coincidence-output', 'children'),
+            Output('delay-histogram', 'figure'),
+            Input('metrics-interval', 'n_intervals')
         )
-        def update_graph_live(n):
-            return self.update_graph(n)
+        def update_coincidences(n):
+            return ([html.Div(line) for line in coincidence_text(self.coincidences, self.sample_rate)],
+                    delay_histogram_figure(self.coincidences, self.sample_rate))
 
         @self.app.callback(
             Output('filename-label', 'children'),
@@ -177,6 +367,19 @@ class DualADCSignalAnalyzer:
                 return self.load_file(contents)
             return "No file loaded yet."
 
+        @self.app.callback(
+            Output('live-status', 'children'),
+            Input('live-button', 'n_clicks')
+        )
+        def live_callback(n_clicks):
+            if n_clicks > 0:
+                try:
+                    return self.start_live()
+                except Exception as e:
+                    logging.error(f"Error starting live source: {e}")
+                    return str(e)
+            return "Live source not started."
+
         self.app.run_server(debug=True)
 
 # Create an instance and run the application
@@ -0,0 +1,226 @@
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    source TEXT,
+    sample_rate REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS peaks (
+    run INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    time REAL NOT NULL,
+    width INTEGER,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS peaks_run_channel_time ON peaks (run, channel, time);
+"""
+
+
+class PeakEventLog:
+    """
+    Append-only SQLite log of detected peaks.
+
+    Every peak is one row (run, channel, absolute sample index, capture time in seconds, run width in
+    samples, peak value). Appends are buffered and written in one transaction per batch; the index
+    on (run, channel, time) keeps time-range queries over millions of events fast. Each analysis
+    start opens a new run, so sample indices of different captures do not mix.
+
+    Queries read through a second connection (WAL lets it read while the writer commits), so a slow
+    query never holds up `append` in the processing thread.
+    """
+
+    def __init__(self, path, batch_size=10000, flush_interval=1.0):
+        """
+        :param path: SQLite database file.
+        :param batch_size: Buffered events that trigger a write.
+        :param flush_interval: Seconds after which buffered events are written anyway.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()  # Dash callbacks run in several threads
+        self.connection = None  # Opened on first use, so importing the app does not create the file
+        self.read_lock = threading.Lock()
+        self.reader = None  # Connection for queries, see `_read`
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.run = None
+        self.run_start = 0  # Rowid after which the rows of the current run follow
+        self.sample_rate = None
+
+    def _connect(self):
+        """The database connection, opened and set up on first use (call with the lock held)."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")  # Readers do not block the writer
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def _read(self, sql, params=()):
+        """Rows of a query, read through the reader connection without holding the writer lock."""
+        with self.lock:
+            self._connect()  # Creates the tables on first use
+            self._flush()  # Buffered events are part of the result
+        with self.read_lock:
+            if self.reader is None:
+                self.reader = sqlite3.connect(self.path, check_same_thread=False)
+            return self.reader.execute(sql, params).fetchall()
+
+    def new_run(self, sample_rate, source=None):
+        """Start logging a new capture. Returns the run id."""
+        with self.lock:
+            self._flush()
+            connection = self._connect()
+            cursor = connection.execute("INSERT INTO runs (started, source, sample_rate) VALUES (?, ?, ?)",
+                                        (time.time(), source, sample_rate))
+            self.run_start = connection.execute("SELECT MAX(rowid) FROM peaks").fetchone()[0] or 0
+            connection.commit()
+            self.run = cursor.lastrowid
+            self.sample_rate = sample_rate
+        return self.run
+
+    def append(self, channel, samples, widths=None, values=None):
+        """
+        Buffer peaks.
+
+        :param channel: Channel name, or one channel name per peak.
+        :param samples: Absolute sample indices of the peaks.
+        :param widths: Run lengths in samples (None if unknown).
+        :param values: Signal values at the peaks (NaN or None if unknown).
+        """
+        if self.run is None or len(samples) == 0:
+            return
+        samples = np.asarray(samples, dtype=np.int64)
+        n = len(samples)
+        widths = [None] * n if widths is None else np.asarray(widths, dtype=np.int64).tolist()
+        if values is None:
+            values = [None] * n
+        else:
+            values = [None if v != v else v for v in np.asarray(values, dtype=np.float64).tolist()]  # NaN -> NULL
+        channels = [channel] * n if isinstance(channel, str) else list(channel)
+        rows = zip([self.run] * n, channels, samples.tolist(), (samples / self.sample_rate).tolist(),
+                   widths, values)
+        with self.lock:
+            self.pending.extend(rows)
+            if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """Write all buffered events."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        try:
+            with metrics.timed('event_log', len(self.pending)):
+                with self._connect() as connection:
+                    connection.executemany("INSERT INTO peaks VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing peak events: {e}")
+        self.pending = []
+
+    def query(self, channel=None, start_time=None, end_time=None, run=None, max_events=None):
+        """
+        Peaks of a run in a time range.
+
+        :param channel: Channel name, or None for all channels.
+        :param start_time: Start of the range in seconds (inclusive), None for the run start.
+        :param end_time: End of the range in seconds (exclusive), None for the run end.
+        :param run: Run id (default: the current run).
+        :param max_events: Thin the result to about this many events by keeping every k-th row.
+        :return: Dict of arrays 'channel', 'sample', 'time', 'width' and 'value', ordered by channel and time.
+        """
+        run = self.run if run is None else run
+        where = ["run = ?"]
+        params = [run]
+        if channel is not None:
+            where.append("channel = ?")
+            params.append(channel)
+        if start_time is not None:
+            where.append("time >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            where.append("time < ?")
+            params.append(end_time)
+        where = " AND ".join(where)
+
+        if max_events:
+            count = self._read(f"SELECT COUNT(*) FROM peaks WHERE {where}", params)[0][0]
+            step = -(-count // max_events)
+            if step > 1:
+                # Rows are appended in time order, so every k-th rowid is an even thinning
+                where += " AND rowid % ? = 0"
+                params.append(step)
+        return _events(self._read(
+            f"SELECT channel, sample, time, width, value FROM peaks WHERE {where} ORDER BY channel, time", params))
+
+    def events_after(self, rowid=None, max_events=None):
+        """
+        Peaks of the current run logged after a given row, for plots that append new events only.
+
+        Rows are found by rowid range instead of the run index, so the cost follows the number of new
+        rows rather than the size of the run.
+
+        :param rowid: Rowid returned by the previous call, or None for the whole run.
+        :param max_events: Thin to every k-th row, with k chosen so the whole run would be about this
+                           many events.
+        :return: Tuple (events, rowid): events as in `query`, and the rowid to pass next time.
+        """
+        rowid = self.run_start if rowid is None else rowid
+        last = self._read("SELECT MAX(rowid) FROM peaks")[0][0] or 0
+        # "+run" keeps SQLite on the rowid range instead of scanning the run in the index
+        where, params = "rowid > ? AND rowid <= ? AND +run = ?", [rowid, last, self.run]
+        step = -(-(last - self.run_start) // max_events) if max_events else 1
+        if step > 1:
+            where += " AND rowid % ? = 0"
+            params.append(step)
+        rows = self._read(f"SELECT channel, sample, time, width, value FROM peaks WHERE {where} ORDER BY channel, time",
+                          params)
+        return _events(rows), max(last, rowid)
+
+    def count(self, run=None, channel=None):
+        """Number of logged peaks of a run (default: the current run)."""
+        run = self.run if run is None else run
+        if channel is None:
+            return self._read("SELECT COUNT(*) FROM peaks WHERE run = ?", (run,))[0][0]
+        return self._read("SELECT COUNT(*) FROM peaks WHERE run = ? AND channel = ?", (run, channel))[0][0]
+
+    def runs(self):
+        """All runs as (id, started, source, sample_rate) tuples, newest first."""
+        return self._read("SELECT id, started, source, sample_rate FROM runs ORDER BY id DESC")
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+        with self.read_lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+
+def _events(rows):
+    """Query rows (channel, sample, time, width, value) as a dict of arrays, NULL as NaN."""
+    channels, samples, times, widths, values = zip(*rows) if rows else ((), (), (), (), ())
+    return {
+        'channel': np.array(channels, dtype=object),
+        'sample': np.array(samples, dtype=np.int64),
+        'time': np.array(times, dtype=np.float64),
+        'width': np.array([np.nan if w is None else w for w in widths], dtype=np.float64),
+        'value': np.array([np.nan if v is None else v for v in values], dtype=np.float64),
+    }
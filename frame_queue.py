@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+
+
+def merge_frames(frames, max_samples):
+    """
+    Merge contiguous chunk results into one, keeping every peak (see `contiguous`).
+
+    Signals are concatenated and trimmed to the newest `max_samples` samples (what the display
+    window can show, None keeps all); peak indices are global, so they are simply concatenated
+    per channel.
+
+    :param frames: Result dicts of contiguous chunks, oldest first.
+    :param max_samples: Maximum number of signal samples to keep per channel.
+    :return: One result dict.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    end = frames[-1]['start'] + len(frames[-1]['signals'])
+    merged = dict(frames[-1])
+    signals = np.concatenate([frame['signals'] for frame in frames])
+    merged['signals'] = signals if max_samples is None else signals[-max_samples:]
+    merged['peaks'] = [np.concatenate(peaks) for peaks in zip(*(frame['peaks'] for frame in frames))]
+    if all('peak_widths' in frame for frame in frames):
+        merged['peak_widths'] = [np.concatenate(widths) for widths in zip(*(frame['peak_widths'] for frame in frames))]
+    merged['peak_summary'] = [" | ".join(s for s in summaries if s)
+                              for summaries in zip(*(frame['peak_summary'] for frame in frames))]
+    merged.pop('display', None)  # Decimated series no longer match the merged signal
+    merged['start'] = end - len(merged['signals'])
+    merged['produced_at'] = frames[0]['produced_at']
+    merged['frames'] = sum(frame.get('frames', 1) for frame in frames)
+    return merged
+
+
+def contiguous(frame, following):
+    """Whether `following` starts right after `frame`, so their signals can be merged (no gap between them)."""
+    return frame['start'] + len(frame['signals']) == following['start']
+
+
+class FrameQueue:
+    """
+    Bounded queue between the processing thread and the display, with a selectable overflow policy.
+
+    - 'block': the producer waits until the display catches up.
+    - 'drop_oldest': the oldest pending frame is discarded (its peaks are lost, counted in `dropped`).
+    - 'coalesce': `get` merges the pending frames into one update and a full queue merges into its
+      newest frame, so every peak is kept while memory stays bounded. Frames are only merged with a
+      frame they follow without a gap; a full queue with gaps between all of its frames drops the
+      oldest.
+
+    Drop-in for the `Queue` methods the analyzer uses (`put`, `get`, `empty`, `qsize`); `wait` lets a
+    push-based display sleep until the processing thread produces a frame.
+    """
+
+    def __init__(self, maxsize, policy=COALESCE, max_samples=None, stop_event=None):
+        if policy not in (BLOCK, DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown frame queue policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_samples = max_samples
+        self.stop_event = stop_event
+        self.frames = deque()
+        self.condition = threading.Condition()
+
+        # Metrics
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_lag = 0.0  # Seconds between production and display of the last frame returned by get
+
+    def put(self, frame):
+        """Queue a processed chunk, applying the overflow policy when full."""
+        frame.setdefault('produced_at', time.monotonic())
+        with self.condition:
+            if self.policy == BLOCK:
+                while len(self.frames) >= self.maxsize:
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        return
+                    self.condition.wait(timeout=0.1)
+            elif len(self.frames) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self.frames.popleft()
+                    self.dropped += 1
+                else:
+                    frame = self._make_room(frame)
+            self.frames.append(frame)
+            self.condition.notify_all()  # Wake a pushing display, see `wait`
+
+    def _make_room(self, frame):
+        """Merge the newest pair of pending frames without a gap between them (counting `frame` as the newest)."""
+        frames = list(self.frames) + [frame]
+        for i in range(len(frames) - 2, -1, -1):
+            if contiguous(frames[i], frames[i + 1]):
+                frames[i:i + 2] = [merge_frames(frames[i:i + 2], self.max_samples)]
+                self.coalesced += 1
+                break
+        else:
+            frames.pop(0)
+            self.dropped += 1
+        self.frames = deque(frames[:-1])
+        return frames[-1]
+
+    def get(self):
+        """Return the next frame (with 'coalesce', all pending frames merged into one), or None if empty."""
+        with self.condition:
+            if not self.frames:
+                return None
+            if self.policy == COALESCE:
+                # Merge up to the first gap; later frames follow in the next update
+                frames = [self.frames.popleft()]
+                while self.frames and contiguous(frames[-1], self.frames[0]):
+                    frames.append(self.frames.popleft())
+                self.coalesced += len(frames) - 1
+                frame = merge_frames(frames, self.max_samples)
+            else:
+                frame = self.frames.popleft()
+            self.condition.notify_all()
+        self.last_lag = time.monotonic() - frame['produced_at']
+        return frame
+
+    def wait(self, timeout=None):
+        """Block until a frame is pending or `timeout` seconds pass. Returns True if a frame is pending."""
+        with self.condition:
+            return bool(self.condition.wait_for(lambda: self.frames, timeout))
+
+    def empty(self):
+        return not self.frames
+
+    def qsize(self):
+        return len(self.frames)
+
+    def clear(self):
+        with self.condition:
+            self.frames.clear()
+            self.condition.notify_all()
+
+    def lag(self):
+        """Age in seconds of the oldest pending frame, or of the last displayed one when nothing is pending."""
+        with self.condition:
+            if self.frames:
+                return time.monotonic() - self.frames[0]['produced_at']
+        return self.last_lag
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+import numpy as np
+from dash import dcc, html
+
+from data_processing import typed_array
+from metrics import metrics, BYTES_BUCKETS
+from utils import FRAME_STREAM_PATH, PUSH_MAX_FPS
+
+KEEPALIVE = 15.0  # Seconds between comments on an idle stream, so closed connections are noticed
+STREAM_SCRIPT = r'frame_stream\.js'  # Client side of the stream in assets/, loaded by Dash on every page
+
+
+def assets_ignore(transport):
+    """Dash `assets_ignore` pattern for an app: only pages that push frames load the stream script."""
+    return '' if transport == 'push' else STREAM_SCRIPT
+
+
+def _event(name, payload):
+    """One Server-Sent Event; NumPy arrays in `payload` are sent as binary typed arrays, see `typed_array`."""
+    return f"event: {name}\ndata: {json.dumps(payload, default=typed_array, separators=(',', ':'))}\n\n"
+
+
+def frame_events(animator, max_fps=PUSH_MAX_FPS):
+    """
+    Server-Sent Events for the live graph, produced as soon as the processing thread queues a chunk.
+
+    A 'figure' event carries the whole (empty) figure, on connect and whenever the channel set
+    changes; a 'frame' event carries one `Animator.build_frame` update. At most `max_fps` frames
+    are sent per second: chunks queued in between are merged by the frame queue, so no peak is lost.
+    Like polling, frames are taken from the analyzer's one queue, so the live view is meant for one
+    browser at a time.
+
+    :param animator: Animator of the analyzer whose frames are sent.
+    :param max_fps: Maximum frames per second (0: unlimited).
+    """
+    analyzer = animator.analyzer
+    queue = analyzer.data_queue
+    interval = 1.0 / max_fps if max_fps > 0 else 0.0
+    next_due = 0.0
+
+    analyzer.figure_reset = False
+    yield _event('figure', json.loads(analyzer.fig.to_json()))
+    while True:
+        if not queue.wait(KEEPALIVE):
+            yield ": keepalive\n\n"
+            continue
+
+        # The channel set changed: send the new empty figure before appending to it
+        if analyzer.figure_reset:
+            analyzer.figure_reset = False
+            yield _event('figure', json.loads(analyzer.fig.to_json()))
+
+        # Hold back to the client's frame rate; chunks arriving meanwhile are merged into this frame
+        delay = next_due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        data = queue.get()
+        if data is None:
+            continue
+        next_due = time.monotonic() + interval
+
+        with metrics.timed('display_update', len(data['signals'])):
+            frame = animator.build_frame(data)
+        frame['produced_at'] = data['produced_at']  # Echoed back by the browser, see register_frame_stream
+        # Times go out as float32: at display resolution, hours of capture still resolve well below a pixel
+        frame['x'] = [typed_array(times, np.float32) for times in frame['x']]
+        message = _event('frame', frame)
+        metrics.observe('adc_push_payload_bytes', len(message), BYTES_BUCKETS)
+        metrics.observe('adc_frame_latency_seconds', time.monotonic() - data['produced_at'], transport='push')
+        yield message
+
+
+def register_frame_stream(server, animator, path=FRAME_STREAM_PATH):
+    """
+    Serve the live frames of `animator` as Server-Sent Events on a Flask server.
+
+    `path` streams `frame_events` (query parameter `max_fps`); the browser (assets/frame_stream.js)
+    posts the 'produced_at' of every frame it has drawn to `path`/ack, which records the end-to-end
+    latency from processing to screen.
+    """
+    from flask import Response, request
+
+    @server.route(path)
+    def frame_stream():
+        max_fps = request.args.get('max_fps', PUSH_MAX_FPS, type=float)
+        return Response(frame_events(animator, max_fps), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @server.route(f'{path}/ack', methods=['POST'])
+    def frame_ack():
+        try:
+            # produced_at is this process's monotonic clock, so no browser clock is involved
+            latency = time.monotonic() - float(request.get_json(force=True)['produced_at'])
+            metrics.observe('adc_end_to_end_latency_seconds', latency, transport='push')
+        except (TypeError, ValueError, KeyError) as e:
+            logging.error(f"Invalid frame acknowledgement: {e}")
+            return '', 400
+        return '', 204
+
+
+def stream_component(graph_id, path=FRAME_STREAM_PATH, max_fps=PUSH_MAX_FPS):
+    """Layout for a pushed graph: the frame rate input and the element assets/frame_stream.js connects from."""
+    return html.Div([
+        html.Label("Max frame rate (fps): "),
+        dcc.Input(id='max-fps', type='number', min=1, max=120, step=1, value=max_fps, debounce=True),
+        html.Div(id='frame-stream', **{'data-url': path, 'data-graph': graph_id, 'data-max-fps': max_fps}),
+    ])
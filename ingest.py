@@ -0,0 +1,183 @@
+import base64
+import io
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from sample_store import SampleStoreWriter, DEFAULT_DTYPE
+from utils import CHUNK_SIZE, CHANNEL_PREFIX
+from metrics import metrics
+
+BASE64_BLOCK_CHARS = 4 * 256 * 1024  # Decode the upload 1 MiB of base64 text at a time
+
+
+class Base64Reader(io.RawIOBase):
+    """
+    Binary file-like object that decodes a base64 string lazily, block by block.
+
+    Only one decoded block is held in memory at a time instead of the whole payload.
+    """
+
+    def __init__(self, text, start=0, block_chars=BASE64_BLOCK_CHARS):
+        self.text = text
+        self.pos = start
+        self.block_chars = block_chars - block_chars % 4  # Whole base64 quanta only
+        self.pending = b''
+        self.pending_pos = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.pending_pos >= len(self.pending):
+            if self.pos >= len(self.text):
+                return 0
+            self.pending = base64.b64decode(self.text[self.pos:self.pos + self.block_chars])
+            self.pending_pos = 0
+            self.pos += self.block_chars
+
+        n = min(len(b), len(self.pending) - self.pending_pos)
+        b[:n] = self.pending[self.pending_pos:self.pending_pos + n]
+        self.pending_pos += n
+        self.bytes_read += n
+        return n
+
+
+def sample_dtype(values):
+    """Integer sample type for parsed values: DEFAULT_DTYPE, or uint16 for unsigned values only that fits."""
+    info = np.iinfo(DEFAULT_DTYPE)
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return np.dtype(DEFAULT_DTYPE)
+    if values.min() >= 0 and values.max() <= np.iinfo(np.uint16).max:
+        return np.dtype('<u2')
+    return np.dtype(DEFAULT_DTYPE)  # Does not fit either: to_samples reports the value
+
+
+def to_samples(values, dtype, columns, first_row=0):
+    """
+    Convert parsed CSV values to integer samples, rounding decimal values to the nearest integer.
+
+    :param values: (rows, channels) array as parsed.
+    :param dtype: Integer sample type, or None to pick it from the values (see `sample_dtype`).
+    :param columns: Channel names of the columns, for error messages.
+    :param first_row: Data row number of the first row, for error messages.
+    :raises ValueError: On a missing or non-numeric value, or a value that does not fit in `dtype`.
+    """
+    if values.dtype.kind not in 'iuf':
+        values = np.stack([pd.to_numeric(values[:, c], errors='coerce') for c in range(values.shape[1])], axis=1)
+    if values.dtype.kind == 'f':
+        missing = np.argwhere(np.isnan(values))
+        if len(missing):
+            row, col = missing[0]
+            raise ValueError(f"Missing or non-numeric value in column '{columns[col]}', row {first_row + row + 1}")
+        values = np.rint(values)
+
+    dtype = sample_dtype(values) if dtype is None else np.dtype(dtype)
+    info = np.iinfo(dtype)
+    outside = np.argwhere((values < info.min) | (values > info.max))
+    if len(outside):
+        row, col = outside[0]
+        raise ValueError(f"Value {values[row, col]:g} in column '{columns[col]}', row {first_row + row + 1} does not "
+                         f"fit in {dtype.name} samples ({info.min} to {info.max})")
+    return values.astype(dtype)
+
+
+def read_csv_blocks(source, columns=None, dtype=None, block_rows=CHUNK_SIZE):
+    """
+    Parse a CSV capture in blocks of rows.
+
+    Decimal values are rounded to the nearest integer; values that do not fit the sample type raise
+    a ValueError naming the column and row. Without a given type, blocks are int16 until the first
+    negative value (int16 from then on) or the first value above the int16 range (uint16 from then
+    on, see `sample_dtype`); earlier blocks without negative values have the same bytes in uint16.
+
+    :param source: CSV file path or binary file-like object.
+    :param columns: Channel columns to keep, in this order (default: every column whose name starts
+                    with CHANNEL_PREFIX, in file order).
+    :param dtype: Integer sample type (default: picked from the data, see above).
+    :param block_rows: Number of CSV rows parsed per block.
+    :return: Generator of (channel names, (rows, channels) array) per block.
+    """
+    if columns is None:
+        keep = lambda c: c.startswith(CHANNEL_PREFIX)
+    else:
+        columns = list(columns)
+        keep = lambda c: c in columns
+    reader = pd.read_csv(source, usecols=keep, chunksize=block_rows, engine='c')
+
+    first_row = 0
+    for block in reader:
+        # The channels are known once the header has been parsed
+        if columns is None:
+            columns = list(block.columns)
+            if not columns:
+                raise ValueError(f"CSV file must contain channel columns ({CHANNEL_PREFIX}1, {CHANNEL_PREFIX}2, ...)")
+        elif not set(columns).issubset(block.columns):
+            raise ValueError("CSV file must contain " + " and ".join(f"'{c}'" for c in columns) + " columns")
+        samples = to_samples(block[columns].to_numpy(), dtype, columns, first_row)
+        if dtype is None and (samples.dtype != np.int16 or (len(samples) and samples.min() < 0)):
+            dtype = samples.dtype  # The sign is known: later blocks keep this type
+        yield columns, samples
+        first_row += len(samples)
+
+
+def ingest_csv(source, path, sample_rate, columns=None, dtype=None, block_rows=CHUNK_SIZE):
+    """
+    Parse a CSV capture in blocks of rows and write the samples straight to a sample store.
+
+    :param source: CSV file path or binary file-like object.
+    :param path: Output sample store path.
+    :param sample_rate: Sample rate in Hz, stored in the header.
+    :param columns: Channel columns to keep, in store order (default: every column whose name starts
+                    with CHANNEL_PREFIX, in file order).
+    :param dtype: Integer sample type (default: picked from the data, see `read_csv_blocks`; the store
+                  switches to uint16 if a later block needs it, see `SampleStoreWriter`).
+    :param block_rows: Number of CSV rows parsed per block.
+    :return: Dict with 'rows', 'bytes', 'seconds' and 'mb_per_s'.
+    """
+    start_time = time.perf_counter()
+    writer = None
+    try:
+        for names, block in read_csv_blocks(source, columns, dtype, block_rows):
+            if writer is None:
+                writer = SampleStoreWriter(path, names, sample_rate, block.dtype)
+            writer.append(block)
+        if writer is None:
+            raise ValueError("CSV file contains no samples")
+        rows = writer.length
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if isinstance(source, (str, os.PathLike)):
+        n_bytes = os.path.getsize(source)
+    else:
+        n_bytes = getattr(source, 'bytes_read', 0)
+    seconds = time.perf_counter() - start_time
+    metrics.observe('adc_stage_duration_seconds', seconds, stage='ingest')
+    metrics.inc('adc_stage_samples_total', rows, stage='ingest')
+    stats = {
+        'rows': rows,
+        'bytes': n_bytes,
+        'seconds': seconds,
+        'mb_per_s': n_bytes / 1e6 / seconds if seconds > 0 else 0.0
+    }
+    logging.info(f"Ingested {rows} rows ({n_bytes / 1e6:.1f} MB) in {seconds:.2f} s, {stats['mb_per_s']:.1f} MB/s")
+    return stats
+
+
+def ingest_upload(contents, path, sample_rate, **kwargs):
+    """
+    Ingest a dcc.Upload `contents` data URL without decoding it into memory all at once.
+
+    :param contents: 'data:<type>;base64,<payload>' string from dcc.Upload.
+    :param path: Output sample store path.
+    :param sample_rate: Sample rate in Hz, stored in the header.
+    :return: Ingest statistics, see `ingest_csv`.
+    """
+    # Find the payload start instead of splitting, which would copy the whole string
+    raw = Base64Reader(contents, start=contents.index(',') + 1)
+    return ingest_csv(raw, path, sample_rate, **kwargs)
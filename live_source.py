@@ -0,0 +1,270 @@
+import logging
+import socket
+import struct
+import threading
+import time
+import numpy as np
+
+from sample_store import DEFAULT_DTYPE
+from utils import CHUNK_SIZE, LIVE_REORDER_FRAMES
+
+# Frame: header, then n_samples x n_channels little-endian int16 samples, interleaved
+FRAME_MAGIC = b'ADCF'
+FRAME_HEADER = struct.Struct('<4sIQHH')  # magic, sequence number, index of the first sample, samples, channels
+MAX_UDP_PAYLOAD = 65507
+RECV_SIZE = 1 << 16  # Bytes per TCP read
+SEQUENCE_MASK = 0xFFFFFFFF  # Sequence numbers wrap around at 32 bits
+
+
+def encode_frame(sequence, first_sample, block):
+    """
+    Pack a (samples, channels) block into one frame.
+
+    :param sequence: Frame counter, incremented by one per frame (used to count lost frames).
+    :param first_sample: Absolute index of the first sample in the block.
+    """
+    block = np.ascontiguousarray(block, dtype=DEFAULT_DTYPE)
+    return FRAME_HEADER.pack(FRAME_MAGIC, sequence & SEQUENCE_MASK, first_sample, *block.shape) + block.tobytes()
+
+
+def decode_frame(data):
+    """
+    Unpack a frame.
+
+    :return: Tuple (sequence, first_sample, block) with block a (samples, channels) view of `data`.
+    """
+    magic, sequence, first_sample, n_samples, n_channels = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Not an ADC frame")
+    block = np.frombuffer(data, dtype=DEFAULT_DTYPE, count=n_samples * n_channels, offset=FRAME_HEADER.size)
+    return sequence, first_sample, block.reshape(n_samples, n_channels)
+
+
+class LiveSource:
+    """
+    Threaded socket reader for ADC frames, re-chunked for the detection pipeline.
+
+    Frames are copied into a preallocated chunk buffer; every `chunk_size` samples, or when samples
+    are missing, `on_chunk(first_sample, block, gap)` is called from the reader thread. `gap` tells
+    the consumer the block does not follow the previous one. Samples arriving late (a reordered UDP
+    frame, or a retransmission) are dropped, so blocks always move forward in sample time.
+
+    A new TCP connection starts a new stream, whose sample indices start over, and so does a sender
+    restart: a frame more than `reorder_frames` sequence numbers behind, or one with a newer sequence
+    number but older samples. `on_stream()` is called from the reader thread after the last chunk of
+    the previous stream and before the first chunk of the new one, so the consumer can start over too.
+    """
+
+    def __init__(self, on_chunk, channels=2, host='0.0.0.0', port=5005, protocol='udp', chunk_size=CHUNK_SIZE,
+                 on_stream=None, reorder_frames=LIVE_REORDER_FRAMES):
+        if protocol not in ('udp', 'tcp'):
+            raise ValueError(f"Unknown protocol: {protocol}")
+        self.on_chunk = on_chunk
+        self.on_stream = on_stream
+        self.reorder_frames = reorder_frames
+        self.channels = channels
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.chunk = np.empty((chunk_size, channels), dtype=DEFAULT_DTYPE)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Counters
+        self.frames = 0
+        self.dropped_frames = 0  # Sequence number gaps
+        self.bad_frames = 0
+        self.late_frames = 0  # Frames whose samples were all already past
+        self.restarts = 0  # Streams started over (TCP reconnections, sender restarts)
+        self.samples = 0
+        self.bytes = 0
+        self.started_at = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def stats(self):
+        """Counters and sustained rates since start."""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+            'bad_frames': self.bad_frames,
+            'late_frames': self.late_frames,
+            'restarts': self.restarts,
+            'samples': self.samples,
+            'samples_per_s': self.samples / elapsed if elapsed else 0.0,
+            'mb_per_s': self.bytes / 1e6 / elapsed if elapsed else 0.0,
+        }
+
+    def _run(self):
+        try:
+            if self.protocol == 'udp':
+                self._run_udp()
+            else:
+                self._run_tcp()
+        except Exception as e:
+            logging.error(f"Error in live source: {e}")
+
+    def _run_udp(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+            sock.bind((self.host, self.port))
+            sock.settimeout(0.2)
+            self._reset()
+            buf = bytearray(MAX_UDP_PAYLOAD)
+            while not self.stop_event.is_set():
+                try:
+                    n = sock.recv_into(buf)
+                except socket.timeout:
+                    continue
+                self._handle(memoryview(buf)[:n])
+            self._flush(gap=False)
+
+    def _run_tcp(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.host, self.port))
+            server.listen(1)
+            server.settimeout(0.2)
+            self._reset()
+            while not self.stop_event.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                # One bad stream must not end the listener: log it and wait for the next connection
+                try:
+                    with conn:
+                        conn.settimeout(0.2)
+                        self._new_stream()
+                        self._read_stream(conn)
+                    self._flush(gap=False)
+                except Exception as e:
+                    logging.error(f"Error in live TCP stream: {e}")
+                    self.filled = 0  # Drop the rest of the failed stream
+
+    def _read_stream(self, conn):
+        """Read frames from a TCP stream; bytes of a partly received frame are kept across timeouts."""
+        buf = bytearray()
+        received = bytearray(RECV_SIZE)
+        while not self.stop_event.is_set():
+            try:
+                n = conn.recv_into(received)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if not n:
+                return
+            buf += memoryview(received)[:n]
+            del buf[:self._handle_stream(buf)]
+
+    def _handle_stream(self, buf):
+        """
+        Handle the complete frames at the start of a stream buffer.
+
+        The header is checked before its sizes are trusted: on a wrong magic the stream has lost sync,
+        and bytes are skipped up to the next magic.
+
+        :return: Number of bytes consumed.
+        """
+        offset = 0
+        while len(buf) - offset >= FRAME_HEADER.size:
+            magic, _, _, n_samples, n_channels = FRAME_HEADER.unpack_from(buf, offset)
+            if magic != FRAME_MAGIC:
+                self.bad_frames += 1
+                found = buf.find(FRAME_MAGIC, offset + 1)
+                # Keep a possible start of the magic at the end of the buffer
+                offset = found if found >= 0 else len(buf) - len(FRAME_MAGIC) + 1
+                continue
+            size = FRAME_HEADER.size + n_samples * n_channels * np.dtype(DEFAULT_DTYPE).itemsize
+            if len(buf) - offset < size:
+                break
+            self._handle(bytes(buf[offset:offset + size]))
+            offset += size
+        return offset
+
+    def _new_stream(self):
+        """Hand over the rest of the current stream and start a new one, telling the consumer if samples were received."""
+        self._flush(gap=False)
+        if self.chunk_start is not None:
+            self.restarts += 1
+            if self.on_stream is not None:
+                self.on_stream()
+        self._reset()
+
+    def _reset(self):
+        self.started_at = self.started_at or time.monotonic()
+        self.expected_sequence = None
+        self.filled = 0
+        self.chunk_start = None
+        self.pending_gap = False
+
+    def _handle(self, data):
+        try:
+            sequence, first_sample, block = decode_frame(data)
+        except (ValueError, struct.error):
+            self.bad_frames += 1
+            return
+        if block.shape[1] != self.channels:
+            self.bad_frames += 1
+            return
+
+        # Sequence numbers wrap around: a difference below half the range is a step forward
+        ahead = None if self.expected_sequence is None else (sequence - self.expected_sequence) & SEQUENCE_MASK
+        forward = ahead is not None and ahead <= SEQUENCE_MASK // 2
+        next_sample = None if self.chunk_start is None else self.chunk_start + self.filled
+
+        # The sender started over: too far behind to be a reordered frame, or newer but with older samples
+        if ahead is not None:
+            restarted = first_sample < next_sample if forward else SEQUENCE_MASK + 1 - ahead > self.reorder_frames
+            if restarted:
+                self._new_stream()
+                ahead = next_sample = None
+
+        # A late frame: drop the samples already past, and the frame if nothing new is left
+        if next_sample is not None and first_sample < next_sample:
+            if first_sample + len(block) <= next_sample:
+                self.late_frames += 1
+                return
+            block = block[next_sample - first_sample:]
+            first_sample = next_sample
+
+        self.frames += 1
+        self.samples += len(block)
+        self.bytes += len(data)
+        # Only forward steps are lost frames; a late frame leaves the expected sequence number as it is
+        if ahead is None or forward:
+            self.dropped_frames += ahead or 0
+            self.expected_sequence = (sequence + 1) & SEQUENCE_MASK
+
+        # Samples missing before this frame: hand over what we have and start a new chunk
+        gap = next_sample is not None and first_sample != next_sample
+        if gap:
+            self._flush(gap=False)
+        if self.filled == 0:
+            self.chunk_start = first_sample
+            self.pending_gap = gap
+
+        while len(block):
+            n = min(len(block), len(self.chunk) - self.filled)
+            self.chunk[self.filled:self.filled + n] = block[:n]
+            self.filled += n
+            block = block[n:]
+            if self.filled == len(self.chunk):
+                self._flush(gap=False)
+
+    def _flush(self, gap):
+        if self.filled:
+            self.on_chunk(self.chunk_start, self.chunk[:self.filled].copy(), self.pending_gap or gap)
+            self.chunk_start += self.filled
+            self.filled = 0
+            self.pending_gap = False
@@ -1,36 +1,57 @@
-import base64
-import io
-
+import logging
 import dash
 import numpy as np
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, Patch, ctx, no_update
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc  # Optional for styling
-import pandas as pd
 import plotly.graph_objs as go
 from dual_adc_analyzer import DualADCSignalAnalyzer
+from result_cache import ResultCache
+from metrics import metrics, register_endpoints
+from Animation import metrics_panel, coincidence_text, delay_histogram_figure, METRICS_STYLE
+from coincidence import CoincidenceMatcher
+from data_processing import typed_array
+from frame_stream import STREAM_SCRIPT
+from utils import RESULT_CACHE_BYTES, THRESHOLD_MIN, THRESHOLD_MAX, THRESHOLD_STEP, DISPLAY_WIDTH, CHANNEL_COLORS
 
 # Initialize the Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])  # Using Bootstrap for styling (optional)
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],  # Using Bootstrap for styling (optional)
+                assets_ignore=STREAM_SCRIPT)  # No live graph on this page
+register_endpoints(app.server)  # Prometheus text format on /metrics
 
 # Initialize your main processing class
 analyzer = DualADCSignalAnalyzer()
 
+# Detection results and figures per (dataset, threshold, min_duration, downsample), and coincidence
+# statistics per (dataset, threshold, min_duration, 'coincidences', tolerance)
+result_cache = ResultCache(RESULT_CACHE_BYTES)
+thresholds = np.arange(THRESHOLD_MIN, THRESHOLD_MAX + 1, THRESHOLD_STEP)
+
 # Define the layout of the app
 app.layout = html.Div([
     html.H1("Dual ADC Signal Analyzer"),
     dcc.Upload(id='upload-data', children=html.Button('Upload CSV')),
+    dcc.Store(id='dataset-id'),  # Callbacks carry only this ID; the samples stay on the server
+    html.Div(id='upload-status'),
     dcc.Loading(id="loading", type="default", children=[
         dcc.Graph(id='signal-plot'),
     ]),
-    dcc.Slider(id='threshold-slider', min=0, max=1000, value=850,
-               marks={i: str(i) for i in range(0, 1001, 100)}, step=10),
+    dcc.Slider(id='threshold-slider', min=THRESHOLD_MIN, max=THRESHOLD_MAX, value=850,
+               marks={i: str(i) for i in range(THRESHOLD_MIN, THRESHOLD_MAX + 1, 100)}, step=THRESHOLD_STEP),
+    dcc.Graph(id='threshold-curve', style={'height': '250px'}),
     html.Div(id='stats-output'),
+    html.Label("Coincidence tolerance (samples): "),
+    dcc.Input(id='coincidence-tolerance', type='number', min=0, step=1, value=analyzer.coincidence_tolerance,
+              debounce=True),
+    dcc.Graph(id='delay-histogram', style={'height': '300px'}),
+    html.Div(id='metrics-output', style=METRICS_STYLE),
+    dcc.Interval(id='metrics-interval', interval=2000),
     html.Div(id='progress-output'),  # To show progress
 
     dbc.Checklist(
         id="downsample-toggle",
         options=[
-            {"label": "Downsample Data (1 in 100)", "value": True},
+            {"label": "Downsample Display (min/max per pixel)", "value": True},
         ],
         value=[],
         switch=True,
@@ -38,67 +59,214 @@ app.layout = html.Div([
 ])
 
 
-# Callback to handle data upload and processing
+def build_figure(result, downsample):
+    """Build the analysis figure from a `process_chunk` result."""
+    with metrics.timed('figure', len(result['signals'])):
+        return _build_figure(result, downsample)
+
+
+def _build_figure(result, downsample):
+    figure = go.Figure()
+
+    # Signal traces; with downsampling only the display is decimated, peaks come from full resolution.
+    # Plotly sends arrays as binary typed arrays: samples keep their int16 store type, sample indices are
+    # narrowed to int32 and the full-resolution x-axis is the regular grid x0/dx.
+    signals = result['signals']
+    if downsample:
+        x, y = result['display']
+        x = x.astype(np.int32)
+    else:
+        x, y = None, signals
+
+    # Plot one signal trace per channel (traces 0..n-1, see viewport_patch). Full-resolution columns
+    # are copied out of the memory-mapped store so the figure can be cached.
+    for i, name in enumerate(result['channels']):
+        axis = dict(x0=0, dx=1) if x is None else dict(x=x if x.ndim == 1 else x[:, i])
+        figure.add_trace(go.Scatter(**axis, y=np.array(y[:, i]), mode='lines', name=f'{name.upper()} Signal',
+                                    line=dict(color=CHANNEL_COLORS[i % len(CHANNEL_COLORS)])))
+
+    # Mark Peaks
+    for i, (name, peaks) in enumerate(zip(result['channels'], result['peaks'])):
+        if len(peaks) > 0:
+            figure.add_trace(go.Scatter(x=peaks.astype(np.int32), y=signals[peaks, i], mode='markers',
+                                        name=f'{name.upper()} Peaks',
+                                        marker=dict(color=CHANNEL_COLORS[i % len(CHANNEL_COLORS)], size=8)))
+
+    figure.update_layout(title='ADC Signal Analysis',
+                         xaxis_title='Samples',
+                         yaxis_title='Signal Value',
+                         showlegend=True)
+    return figure
+
+
+def visible_range(relayout_data, n_samples):
+    """Sample range [start, stop) shown after a zoom or pan, or None if the x-axis did not change."""
+    if not relayout_data:
+        return None
+    if relayout_data.get('xaxis.autorange'):
+        return 0, n_samples
+    if 'xaxis.range[0]' in relayout_data:
+        start, stop = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        start, stop = relayout_data['xaxis.range']
+    else:
+        return None
+    return int(np.floor(start)), int(np.ceil(stop)) + 1
+
+
+def viewport_patch(pyramid, start, stop):
+    """
+    Replace the signal traces with pyramid data sized for the visible sample range.
+
+    The data goes out as binary typed arrays; raw samples (level 0) lie on a regular grid, sent as
+    x0/dx with x cleared.
+    """
+    with metrics.timed('viewport', stop - start):
+        x, y, level = pyramid.window(None, start, stop, 2 * DISPLAY_WIDTH)  # All channels in one read
+        x0 = int(x[0]) if len(x) else 0  # The window is clipped to the capture
+        x = None if level == 0 else typed_array(x, np.int32)
+        patch = Patch()
+        for trace in range(y.shape[1]):
+            patch['data'][trace]['x'] = x
+            patch['data'][trace]['x0'] = x0
+            patch['data'][trace]['dx'] = 1
+            patch['data'][trace]['y'] = typed_array(y[:, trace])
+        return patch
+
+
+def build_threshold_curve(counts, threshold):
+    """Peak count vs. threshold for each channel, with the current threshold marked."""
+    figure = go.Figure()
+    for name, channel_counts in counts.items():
+        figure.add_trace(go.Scatter(x=thresholds, y=channel_counts, mode='lines+markers', name=name.upper()))
+    figure.add_vline(x=threshold, line_dash='dash', line_color='gray')
+    figure.update_layout(title='Peak Count vs. Threshold (click to select)',
+                         xaxis_title='Threshold',
+                         yaxis_title='Peaks',
+                         margin=dict(t=40, b=40))
+    return figure
+
+
+# Ingest an upload once; the browser's copy of the file is cleared so it is not sent again
+@app.callback(
+    Output('dataset-id', 'data'),
+    Output('upload-status', 'children'),
+    Output('upload-data', 'contents'),
+    Input('upload-data', 'contents'),
+    State('upload-data', 'filename'),
+    prevent_initial_call=True
+)
+def register_upload(contents, filename):
+    if contents is None:
+        raise PreventUpdate
+    try:
+        dataset_id, stats = analyzer.datasets.add_upload(contents, analyzer.sample_rate, filename)
+    except Exception as e:
+        logging.error(f"Error loading file: {e}")
+        return no_update, str(e), None
+    if stats is None:
+        return dataset_id, f"Loaded: {filename} (already stored)", None
+    return dataset_id, f"Loaded: {filename} ({stats['rows']} samples, {stats['mb_per_s']:.1f} MB/s)", None
+
+
+# Callback to handle data processing
 @app.callback(
     Output('signal-plot', 'figure'),
     Output('stats-output', 'children'),
-    Input('upload-data', 'contents'),
+    Output('threshold-curve', 'figure'),
+    Output('delay-histogram', 'figure'),
+    Input('dataset-id', 'data'),
     Input('threshold-slider', 'value'),
-    Input('downsample-toggle', 'value')
+    Input('downsample-toggle', 'value'),
+    Input('signal-plot', 'relayoutData'),
+    Input('coincidence-tolerance', 'value')
 )
-def update_output(uploaded_data, threshold, downsample_value):
-    if uploaded_data is not None:
-        # Handle file upload and parsing
-        content_type, content_string = uploaded_data.split(',')
-        decoded = base64.b64decode(content_string)
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-
-        # Process the data using the analyzer
+def update_output(dataset_id, threshold, downsample_value, relayout_data, tolerance):
+    dataset = analyzer.datasets.get(dataset_id) if dataset_id else None
+
+    if ctx.triggered_id == 'signal-plot':
+        # Zoom or pan: only the downsampled traces need new data, at the level matching the view
+        if dataset is None or not downsample_value:
+            return no_update, no_update, no_update, no_update
+        pyramid = dataset.pyramid()
+        visible = visible_range(relayout_data, len(pyramid))
+        if visible is None:
+            return no_update, no_update, no_update, no_update
+        return viewport_patch(pyramid, *visible), no_update, no_update, no_update
+
+    if dataset_id is not None and dataset is None:
+        return go.Figure(), "Dataset no longer available, please upload it again.", go.Figure(), go.Figure()
+
+    if dataset is not None:
         downsample = bool(downsample_value)
-        result = analyzer.process_chunk(df, threshold, downsample)
+        key = (dataset_id, threshold, analyzer.min_duration, downsample)
 
-        # Create the plotly figure
-        figure = go.Figure()
+        cached = result_cache.get(key)
+        if cached is None:
+            store = dataset.store
+            if downsample:
+                pyramid = dataset.pyramid()
+                analyzer.datasets.evict(keep=dataset_id)  # The pyramid counts against the disk budget
 
-        # Plot ADC1 Signal
-        figure.add_trace(go.Scatter(x=np.arange(len(result['adc1'])), y=result['adc1'],
-                                    mode='lines', name='ADC1 Signal'))
+            # One-time sweep over all slider thresholds; later slider moves are lookups
+            threshold_indexes = dataset.threshold_indexes(thresholds, analyzer.min_duration)
 
-        # Plot ADC2 Signal
-        figure.add_trace(go.Scatter(x=np.arange(len(result['adc2'])), y=result['adc2'],
-                                    mode='lines', name='ADC2 Signal'))
+            # Process the data using the analyzer
+            result = analyzer.process_chunk(store.data, threshold, False, indexes=threshold_indexes,
+                                            channels=store.channel_names)
+            if downsample:
+                # Overview of the whole capture; zooming fetches finer levels, see viewport_patch
+                result['display'] = pyramid.window(None, 0, len(store), 2 * DISPLAY_WIDTH)[:2]
 
-        # Mark Peaks
-        if downsample:
-            # Downsample the peak indices as well
-            adc1_peaks = result['adc1_peaks'][::100]
-            adc2_peaks = result['adc2_peaks'][::100]
+            # Cache peaks and the figure, not the memory-mapped signals
+            cached = {
+                'result': {k: v for k, v in result.items() if k != 'signals'},
+                'figure': build_figure(result, downsample),
+                'counts': {name: index.counts for name, index in threshold_indexes.items()}
+            }
+            result_cache.put(key, cached)
 
-            # Adjust the x-axis to match the downsampled data
-            x_axis = np.arange(0, len(result['adc1']), 100)
-        else:
-            adc1_peaks = result['adc1_peaks']
-            adc2_peaks = result['adc2_peaks']
-            x_axis = np.arange(len(result['adc1']))
+        result = cached['result']
+        cache_stats = result_cache.stats()
+        peak_counts = " | ".join(f"{name.upper()} Peaks: {len(peaks)}"
+                                 for name, peaks in zip(result['channels'], result['peaks']))
+        stats = f"{peak_counts} | Cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']}"
 
-        if len(adc1_peaks) > 0:
-            figure.add_trace(go.Scatter(x=x_axis[adc1_peaks.astype(int)], y=result['adc1'][adc1_peaks.astype(int)],
-                                        mode='markers', name='ADC1 Peaks', marker=dict(color='red', size=8)))
+        # Pair the first channel's peaks with every other channel's, once per peak set and tolerance
+        tolerance = analyzer.coincidence_tolerance if tolerance is None else tolerance
+        coincidence_key = (dataset_id, threshold, analyzer.min_duration, 'coincidences', tolerance)
+        coincidences = result_cache.get(coincidence_key)
+        if coincidences is None:
+            sample_rate = dataset.store.sample_rate
+            matcher = CoincidenceMatcher(result['channels'], tolerance)
+            matcher.update(result['peaks'])
+            coincidences = {'lines': coincidence_text(matcher, sample_rate),
+                            'figure': delay_histogram_figure(matcher, sample_rate)}
+            result_cache.put(coincidence_key, coincidences)
+        stats = [html.Div(stats)] + [html.Div(line) for line in coincidences['lines']]
 
-        if len(adc2_peaks) > 0:
-            figure.add_trace(go.Scatter(x=x_axis[adc2_peaks.astype(int)], y=result['adc2'][adc2_peaks.astype(int)],
-                                        mode='markers', name='ADC2 Peaks', marker=dict(color='blue', size=8)))
+        return (cached['figure'], stats, build_threshold_curve(cached['counts'], threshold),
+                coincidences['figure'])
 
-        figure.update_layout(title='ADC Signal Analysis',
-                             xaxis_title='Samples',
-                             yaxis_title='Signal Value',
-                             showlegend=True)
+    return go.Figure(), "No data processed yet.", go.Figure(), go.Figure()
 
-        stats = f"ADC1 Peaks: {len(adc1_peaks)} | ADC2 Peaks: {len(adc2_peaks)}"
 
-        return figure, stats
+@app.callback(
+    Output('metrics-output', 'children'),
+    Input('metrics-interval', 'n_intervals')
+)
+def update_metrics(n_intervals):
+    return metrics_panel()
 
-    return go.Figure(), "No data processed yet."
+
+# Pick the threshold by clicking on the peak count curve
+@app.callback(
+    Output('threshold-slider', 'value'),
+    Input('threshold-curve', 'clickData'),
+    prevent_initial_call=True
+)
+def select_threshold(click_data):
+    return click_data['points'][0]['x']
 
 # Run the app
 if __name__ == '__main__':
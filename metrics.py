@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+HELP = {
+    'adc_stage_duration_seconds': "Time spent per pipeline stage",
+    'adc_stage_samples_total': "Samples handled per pipeline stage",
+    'adc_callback_payload_bytes': "Serialized Dash callback response size",
+    'adc_push_payload_bytes': "Serialized pushed frame size",
+    'adc_frame_latency_seconds': "Time from processing a chunk to sending it to the browser",
+    'adc_end_to_end_latency_seconds': "Time from processing a chunk to the browser drawing it",
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing is one bisect and two additions."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile: upper bound of the bucket holding it."""
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Metrics:
+    """
+    Registry of pipeline metrics, cheap enough to stay enabled.
+
+    Histograms and counters are keyed by name and labels; gauges are read from callables when rendered.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # name -> (callable, help)
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, read, help_text=''):
+        """Register a gauge whose value is read from `read()` at render time."""
+        self.gauges[name] = (read, help_text)
+
+    @contextmanager
+    def timed(self, stage, samples=0):
+        """Time a block as one observation of `stage`, optionally counting the samples it handled."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('adc_stage_duration_seconds', time.perf_counter() - start, stage=stage)
+            if samples:
+                self.inc('adc_stage_samples_total', samples, stage=stage)
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name, (read, help_text) in sorted(self.gauges.items()):
+            lines += [f"# HELP {name} {help_text or name}", f"# TYPE {name} gauge", f"{name} {read()}"]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One short line per stage: count, mean and p95 duration, and throughput where samples are counted."""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = dict(self.counters)
+
+        lines = []
+        for (name, labels), histogram in histograms:
+            if name != 'adc_stage_duration_seconds' or not histogram.count:
+                continue
+            stage = dict(labels)['stage']
+            line = (f"{stage}: {histogram.count}x, mean {1000 * histogram.sum / histogram.count:.1f} ms, "
+                    f"p95 <= {1000 * histogram.quantile(0.95):.1f} ms")
+            samples = counters.get(('adc_stage_samples_total', labels))
+            if samples and histogram.sum > 0:
+                line += f", {samples / histogram.sum / 1e6:.1f} MS/s"
+            lines.append(line)
+
+        for (name, labels), histogram in histograms:
+            if name in ('adc_frame_latency_seconds', 'adc_end_to_end_latency_seconds') and histogram.count:
+                kind = 'end-to-end' if name == 'adc_end_to_end_latency_seconds' else 'frame'
+                lines.append(f"{kind} latency ({dict(labels)['transport']}): {histogram.count}x, "
+                             f"mean {1000 * histogram.sum / histogram.count:.1f} ms, "
+                             f"p95 <= {1000 * histogram.quantile(0.95):.1f} ms")
+
+        for name, unit in (('adc_callback_payload_bytes', 'callback'), ('adc_push_payload_bytes', 'pushed frame')):
+            payload = [h for (n, _), h in histograms if n == name and h.count]
+            if payload:
+                total = sum(h.sum for h in payload)
+                count = sum(h.count for h in payload)
+                lines.append(f"payload: mean {total / count / 1e3:.1f} kB per {unit}")
+        for name, (read, _) in sorted(self.gauges.items()):
+            lines.append(f"{name}: {read()}")
+        return lines
+
+
+metrics = Metrics()  # Process-wide registry
+
+
+def register_endpoints(server, path='/metrics'):
+    """
+    Expose `metrics` on a Flask server and time every Dash callback request, including the JSON
+    serialization of its response.
+    """
+    from flask import Response, g, request
+    @server.route(path)
+    def prometheus_metrics():
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        if request.path.endswith('_dash-update-component') and 'metrics_start' in g:
+            metrics.observe('adc_stage_duration_seconds', time.perf_counter() - g.metrics_start, stage='callback')
+            if not response.direct_passthrough:
+                metrics.observe('adc_callback_payload_bytes', response.calculate_content_length() or 0,
+                                BYTES_BUCKETS)
+        return response
@@ -0,0 +1,105 @@
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from data_processing import StreamingPeakDetector, build_result, find_channel_runs
+from sample_store import SampleStore
+from utils import CHUNK_SIZE
+from metrics import metrics
+
+_worker_stores = {}  # Per worker process: path -> SampleStore, so each file is mapped once
+
+
+def _chunk_runs(path, start, stop, threshold):
+    """Worker task: runs above threshold of all channels of samples [start, stop) of a sample store."""
+    store = _worker_stores.get(path)
+    if store is None:
+        store = _worker_stores[path] = SampleStore(path)
+    return find_channel_runs(store.data[start:stop] > threshold)
+
+
+def analyze_store_parallel(path, threshold, min_duration=50, chunk_size=CHUNK_SIZE, workers=None,
+                           stop_event=None, downsample=False):
+    """
+    Analyze a sample store with a process pool, yielding chunk results in order.
+
+    Workers memory-map the store themselves and only send back run boundaries. The parent feeds
+    those runs to a StreamingPeakDetector over all channels in chunk order, so pulses spanning chunk
+    boundaries are stitched exactly as in a single pass. At most two chunks per worker are in flight.
+
+    :param path: Sample store path.
+    :param threshold: The threshold value to detect peaks.
+    :param min_duration: Minimum run length of a peak, in samples.
+    :param chunk_size: Samples per chunk.
+    :param workers: Number of worker processes (default: CPU count).
+    :param stop_event: Optional threading.Event to stop early.
+    :param downsample: Add decimated display series to each result.
+    :return: Generator of result dicts as produced by `process_chunk` with streaming detectors.
+    """
+    store = SampleStore(path)
+    workers = workers or os.cpu_count()
+    detector = StreamingPeakDetector(threshold, min_duration, len(store.channel_names))
+    chunk_starts = iter(range(0, len(store), chunk_size))
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit_next():
+            start = next(chunk_starts, None)
+            if start is not None:
+                stop = min(start + chunk_size, len(store))
+                pending.append((start, stop, pool.submit(_chunk_runs, path, start, stop, threshold)))
+
+        for _ in range(2 * workers):
+            submit_next()
+
+        while pending:
+            if stop_event is not None and stop_event.is_set():
+                for _, _, future in pending:
+                    future.cancel()
+                break
+
+            start, stop, future = pending.popleft()
+            with metrics.timed('detect_parallel', stop - start):
+                runs = future.result()
+                submit_next()
+
+                final = stop >= len(store)
+                peaks = detector.feed_runs(*runs, stop - start, final)
+            yield build_result(store.data[start:stop], peaks, start, downsample, detector.widths, store.channel_names,
+                               None if final else detector.horizon)
+
+
+def benchmark(path, worker_counts, threshold=850, chunk_size=CHUNK_SIZE):
+    """
+    Measure parallel throughput on one file for several worker counts.
+
+    :return: List of dicts with 'workers', 'seconds', 'samples_per_s', 'peaks' and 'speedup'.
+    """
+    n_samples = len(SampleStore(path))
+    results = []
+    for workers in worker_counts:
+        start_time = time.perf_counter()
+        peaks = sum(sum(len(p) for p in r['peaks'])
+                    for r in analyze_store_parallel(path, threshold, chunk_size=chunk_size, workers=workers))
+        seconds = time.perf_counter() - start_time
+        results.append({'workers': workers, 'seconds': seconds, 'samples_per_s': n_samples / seconds, 'peaks': peaks,
+                        'speedup': results[0]['seconds'] / seconds if results else 1.0})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark parallel chunk analysis on a sample store file.")
+    parser.add_argument('path', help="Sample store file (e.g. a dataset written by load_file)")
+    parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(os.cpu_count().bit_length())),
+                        help="Comma-separated worker counts to compare")
+    parser.add_argument('--threshold', type=float, default=850)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for row in benchmark(args.path, [int(w) for w in args.workers.split(',')], args.threshold, args.chunk_size):
+        print(f"{row['workers']:>3} workers: {row['seconds']:7.2f} s, {row['samples_per_s'] / 1e6:7.1f} MS/s, "
+              f"speedup {row['speedup']:.2f}x, {row['peaks']} peaks")
@@ -7,19 +7,19 @@ import pandas as pd
 from collections import deque
 import time
 
+from utils import CHANNEL_COLORS
+
 
 def setup_plot(analyzer):
     # Plot setup using Plotly
     fig = go.Figure()
 
-    # ADC1 and ADC2 traces
-    fig.add_trace(go.Scatter(x=[], y=[], mode='lines', name='ADC1 Signal', line=dict(color='blue')))
-    fig.add_trace(
-        go.Scatter(x=[], y=[], mode='markers', name='ADC1 Peaks', marker=dict(color='red', size=10, symbol='x')))
-
-    fig.add_trace(go.Scatter(x=[], y=[], mode='lines', name='ADC2 Signal', line=dict(color='green')))
-    fig.add_trace(
-        go.Scatter(x=[], y=[], mode='markers', name='ADC2 Peaks', marker=dict(color='red', size=10, symbol='x')))
+    # Signal and peak traces for every channel: trace 2 * i is the signal of channel i, 2 * i + 1 its peaks
+    for i, name in enumerate(analyzer.channel_names):
+        color = CHANNEL_COLORS[i % len(CHANNEL_COLORS)]
+        fig.add_trace(go.Scatter(x=[], y=[], mode='lines', name=f'{name.upper()} Signal', line=dict(color=color)))
+        fig.add_trace(
+            go.Scatter(x=[], y=[], mode='markers', name=f'{name.upper()} Peaks', marker=dict(color=color, size=10, symbol='x')))
 
     fig.update_layout(
         title="Dual ADC Signal Analyzer",
@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+FINGERPRINT_BLOCK = 1 << 20  # Characters of a string hashed at a time
+
+
+def fingerprint(data):
+    """
+    Short content hash identifying a dataset.
+
+    A string is encoded and hashed slice by slice, so hashing a large upload does not copy it; the
+    digest is the same as for the whole encoded string.
+
+    :param data: str or bytes, e.g. the upload contents.
+    :return: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, str):
+        for i in range(0, len(data), FINGERPRINT_BLOCK):
+            digest.update(data[i:i + FINGERPRINT_BLOCK].encode('utf-8'))
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def estimate_size(obj):
+    """Approximate memory held by a cached value, in bytes (arrays, strings and containers of them)."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(estimate_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(v) for v in obj)
+    if hasattr(obj, 'to_plotly_json'):
+        return estimate_size(obj.to_plotly_json())
+    return 64
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by an approximate memory budget.
+
+    Counts hits, misses and evictions so the hit rate can be checked while scrubbing the UI.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store `value`, evicting least recently used entries to stay within the budget."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            logging.debug(f"Not caching {size} byte result, larger than the cache budget")
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Counters and current usage as a dict."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes
+            }
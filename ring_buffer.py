@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size ring buffer of multi-channel samples with a parallel ring of absolute sample indices.
+
+    Storage is mirrored (every sample is written twice, `capacity` apart), so the buffered window
+    is always one contiguous slice and `view` never copies.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float64):
+        self.capacity = capacity
+        self.channels = channels
+        self.data = np.zeros((2 * capacity, channels), dtype=dtype)
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.clear()
+
+    def clear(self):
+        self.head = 0  # Physical position of the next write, in [0, capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, values, timestamps):
+        """
+        Append samples; only the newest `capacity` samples are kept.
+
+        :param values: Array of shape (samples, channels), or (samples,) for one channel.
+        :param timestamps: Absolute sample index of each row.
+        """
+        values = np.asarray(values).reshape(-1, self.channels)
+        timestamps = np.asarray(timestamps)
+        if len(values) > self.capacity:
+            values = values[-self.capacity:]
+            timestamps = timestamps[-self.capacity:]
+        n = len(values)
+
+        # At most two segments: up to the end of the ring, then wrapping around to the start
+        first = min(n, self.capacity - self.head)
+        for src, dst in ((slice(0, first), self.head), (slice(first, n), 0)):
+            count = src.stop - src.start
+            if count == 0:
+                continue
+            for offset in (dst, dst + self.capacity):
+                self.data[offset:offset + count] = values[src]
+                self.timestamps[offset:offset + count] = timestamps[src]
+
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def view(self):
+        """
+        Contiguous, oldest-first view of the buffered window (no copy).
+
+        :return: Tuple (timestamps, data) with shapes (size,) and (size, channels).
+        """
+        start = (self.head - self.size) % self.capacity
+        return self.timestamps[start:start + self.size], self.data[start:start + self.size]
+
+    def unwrap(self):
+        """Oldest-first copy of the buffered window, see `view`."""
+        timestamps, data = self.view()
+        return timestamps.copy(), data.copy()
+
+    def locate(self, sample_indices):
+        """
+        Find buffered samples by absolute sample index.
+
+        :param sample_indices: Sorted absolute sample indices.
+        :return: Tuple (positions, found): positions into `view()` of the indices still buffered, and a
+                 mask over `sample_indices` telling which ones those are.
+        """
+        timestamps, _ = self.view()
+        sample_indices = np.asarray(sample_indices, dtype=np.int64)
+        positions = np.searchsorted(timestamps, sample_indices)
+        found = positions < len(timestamps)
+        found[found] = timestamps[positions[found]] == sample_indices[found]
+        return positions[found], found
@@ -0,0 +1,119 @@
+import struct
+import numpy as np
+
+# File layout: fixed header, channel names, padding up to HEADER_ALIGN, then the samples as
+# one interleaved (samples, channels) array. A channel is a strided column of that array.
+MAGIC = b'ADCS'
+VERSION = 1
+HEADER_FORMAT = '<4sHHIdQ8s'  # magic, version, channel count, data offset, sample rate, sample count, dtype
+HEADER_ALIGN = 64
+DEFAULT_DTYPE = '<i2'
+
+
+def _data_offset(channel_names):
+    size = struct.calcsize(HEADER_FORMAT) + len(_encode_names(channel_names))
+    return -(-size // HEADER_ALIGN) * HEADER_ALIGN
+
+
+def _encode_names(channel_names):
+    return '\0'.join(channel_names).encode('utf-8')
+
+
+class SampleStoreWriter:
+    """
+    Write a capture to the on-disk sample store block by block.
+
+    The sample count in the header is filled in by `close`, so the total length does not need to
+    be known up front. Neither does the sign of the data: an int16 store with no negative samples
+    yet takes a block of uint16 values by switching its type to uint16, whose bytes are the same for
+    the samples already written.
+    """
+
+    def __init__(self, path, channel_names, sample_rate, dtype=DEFAULT_DTYPE):
+        self.path = path
+        self.channel_names = list(channel_names)
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.negative = False  # A negative sample was written
+        self.data_offset = _data_offset(self.channel_names)
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        names = _encode_names(self.channel_names)
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(self.channel_names), self.data_offset,
+                             self.sample_rate, self.length, self.dtype.str.encode('ascii'))
+        self.file.seek(0)
+        self.file.write(header + names)
+        self.file.write(b'\0' * (self.data_offset - len(header) - len(names)))
+
+    def append(self, block):
+        """
+        Append samples.
+
+        :param block: Array of shape (samples, channels), in channel order.
+        """
+        block = np.asarray(block)
+        if block.ndim != 2 or block.shape[1] != len(self.channel_names):
+            raise ValueError(f"Expected a (samples, {len(self.channel_names)}) block, got shape {block.shape}")
+        if len(block) == 0:
+            return
+        low, high = block.min(), block.max()
+        info = np.iinfo(self.dtype)
+        if low < info.min or high > info.max:
+            unsigned = np.iinfo(np.uint16)
+            if self.dtype != np.int16 or self.negative or low < unsigned.min or high > unsigned.max:
+                raise ValueError(f"Sample values do not fit in {self.dtype.name}")
+            self.dtype = np.dtype('<u2')  # Written in the header by `close`
+        self.negative = self.negative or low < 0
+        self.file.write(np.ascontiguousarray(block, dtype=self.dtype).tobytes())
+        self.length += len(block)
+
+    def close(self):
+        """Write the final sample count to the header and close the file."""
+        end = self.file.tell()
+        self._write_header()
+        self.file.seek(end)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SampleStore:
+    """
+    Read-only, memory-mapped view of a sample store file.
+
+    Opening is independent of the file size; pages are read from disk only when samples are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, version, n_channels, data_offset, sample_rate, length, dtype = struct.unpack(HEADER_FORMAT, header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a sample store file")
+            if version != VERSION:
+                raise ValueError(f"Unsupported sample store version {version}")
+            names = f.read(data_offset - len(header)).rstrip(b'\0').decode('utf-8')
+
+        self.channel_names = names.split('\0')[:n_channels]
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        self.data_offset = data_offset
+        if length:
+            self.data = np.memmap(path, dtype=self.dtype, mode='r', offset=data_offset, shape=(length, n_channels))
+        else:
+            self.data = np.empty((0, n_channels), dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    def channel(self, name):
+        """Zero-copy view of one channel."""
+        return self.data[:, self.channel_names.index(name)]
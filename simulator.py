@@ -0,0 +1,92 @@
+import argparse
+import logging
+import random
+import socket
+import time
+
+from live_source import encode_frame
+from sample_store import SampleStore
+from synthetic import SyntheticCapture
+from utils import SAMPLE_RATE, LIVE_PORT, LIVE_PROTOCOL, LIVE_FRAME_SAMPLES
+
+
+def _store_blocks(path, frame_samples, loop):
+    store = SampleStore(path)
+    while True:
+        for i in range(0, len(store), frame_samples):
+            yield store.data[i:i + frame_samples]
+        if not loop:
+            return
+
+
+def simulate(blocks, host='127.0.0.1', port=LIVE_PORT, protocol=LIVE_PROTOCOL, rate=SAMPLE_RATE, loss=0.0,
+             seed=0):
+    """
+    Send (samples, channels) blocks as ADC frames, paced to `rate` samples per second per channel.
+
+    :param blocks: Iterable of sample blocks, one frame each.
+    :param host: Receiver address.
+    :param port: Receiver port.
+    :param protocol: 'udp' or 'tcp'.
+    :param rate: Samples per second per channel; 0 sends as fast as possible.
+    :param loss: Fraction of frames to skip, to exercise the receiver's dropped-frame counting.
+    :param seed: Random seed for `loss`.
+    :return: Dict with 'frames', 'skipped', 'samples', 'seconds' and 'samples_per_s'.
+    """
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if protocol == 'udp' else socket.SOCK_STREAM)
+    if protocol == 'tcp':
+        sock.connect((host, port))
+
+    frames = skipped = position = 0
+    start_time = time.perf_counter()
+    try:
+        for sequence, block in enumerate(blocks):
+            if rate:
+                # Sleep until this frame is due instead of a fixed interval, so pacing does not drift
+                delay = start_time + position / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if loss and rng.random() < loss:
+                skipped += 1
+            else:
+                frame = encode_frame(sequence, position, block)
+                if protocol == 'udp':
+                    sock.sendto(frame, (host, port))
+                else:
+                    sock.sendall(frame)
+                frames += 1
+            position += len(block)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+    seconds = time.perf_counter() - start_time
+    return {'frames': frames, 'skipped': skipped, 'samples': position, 'seconds': seconds,
+            'samples_per_s': position / seconds if seconds > 0 else 0.0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a synthetic or recorded capture as a live ADC source.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=LIVE_PORT)
+    parser.add_argument('--protocol', choices=('udp', 'tcp'), default=LIVE_PROTOCOL)
+    parser.add_argument('--rate', type=float, default=SAMPLE_RATE, help="Samples per second per channel (0: unpaced)")
+    parser.add_argument('--frame-samples', type=int, default=LIVE_FRAME_SAMPLES)
+    parser.add_argument('--store', help="Sample store file to replay instead of synthetic data")
+    parser.add_argument('--loop', action='store_true', help="Replay the store file forever")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds of synthetic data to send")
+    parser.add_argument('--channels', type=int, default=2, help="Channels of the synthetic data")
+    parser.add_argument('--loss', type=float, default=0.0, help="Fraction of frames to drop on purpose")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.store:
+        blocks = _store_blocks(args.store, args.frame_samples, args.loop)
+    else:
+        blocks = SyntheticCapture(int(args.duration * SAMPLE_RATE), channels=args.channels).blocks(args.frame_samples)
+    stats = simulate(blocks, args.host, args.port, args.protocol, args.rate, args.loss)
+    logging.info(f"Sent {stats['frames']} frames ({stats['skipped']} skipped), {stats['samples']} samples in "
+                 f"{stats['seconds']:.2f} s, {stats['samples_per_s'] / 1e6:.2f} MS/s")
@@ -0,0 +1,98 @@
+import numpy as np
+
+from sample_store import SampleStoreWriter, DEFAULT_DTYPE
+from utils import CHUNK_SIZE, SAMPLE_RATE
+
+# Value range seen on the boards (see the y-axis range in plot_setup.py)
+ADC_MIN = 390
+ADC_MAX = 1520
+
+
+class SyntheticCapture:
+    """
+    Deterministic two-channel (or N-channel) ADC capture generator.
+
+    Each channel is a noisy baseline with flat-topped pulses arriving as a Poisson process. Blocks are
+    generated one at a time, pulses may continue across block boundaries, and the same parameters
+    always give the same samples, so captures of any length can be produced in constant memory.
+    """
+
+    def __init__(self, n_samples, sample_rate=SAMPLE_RATE, channels=('adc1', 'adc2'), baseline=400, noise=5.0,
+                 pulse_rate=20.0, pulse_width=100, amplitude=1100, seed=0):
+        """
+        :param n_samples: Capture length in samples.
+        :param sample_rate: Sample rate in Hz.
+        :param channels: Channel names, or a channel count for adc1, adc2, ...
+        :param baseline: Baseline ADC value.
+        :param noise: Standard deviation of the Gaussian baseline noise.
+        :param pulse_rate: Mean pulses per second per channel.
+        :param pulse_width: Mean pulse width in samples (jittered by +-20%).
+        :param amplitude: Pulse height above baseline.
+        :param seed: Random seed.
+        """
+        self.n_samples = n_samples
+        self.sample_rate = sample_rate
+        self.channels = [f'adc{i + 1}' for i in range(channels)] if isinstance(channels, int) else list(channels)
+        self.baseline = baseline
+        self.noise = noise
+        self.pulse_rate = pulse_rate
+        self.pulse_width = pulse_width
+        self.amplitude = amplitude
+        self.rng = np.random.default_rng(seed)
+        self.position = 0
+        self.carry = np.zeros(len(self.channels), dtype=np.int64)  # Pulse samples left over from the last block
+        self.pulse_starts = [[] for _ in self.channels]  # Ground truth, global sample index of every pulse
+
+    def blocks(self, block_size=CHUNK_SIZE):
+        """Yield (samples, channels) int16 blocks until the capture is complete."""
+        while self.position < self.n_samples:
+            n = min(block_size, self.n_samples - self.position)
+            yield self._block(n)
+
+    def _block(self, n):
+        block = self.baseline + self.rng.normal(0, self.noise, size=(n, len(self.channels)))
+        pulse = np.zeros((n + 1, len(self.channels)), dtype=np.int32)  # Pulse on/off edges, cumsum'd below
+
+        for c in range(len(self.channels)):
+            # Pulse still running from the previous block
+            carry = min(self.carry[c], n)
+            pulse[0, c] += 1
+            pulse[carry, c] -= 1
+            self.carry[c] -= carry
+
+            count = self.rng.poisson(self.pulse_rate * n / self.sample_rate)
+            starts = np.sort(self.rng.integers(0, n, count))
+            widths = np.round(self.pulse_width * self.rng.uniform(0.8, 1.2, count)).astype(np.int64)
+            ends = starts + widths
+            np.add.at(pulse[:, c], starts, 1)
+            np.add.at(pulse[:, c], np.minimum(ends, n), -1)
+            if count:
+                self.carry[c] = max(self.carry[c], ends.max() - n)
+            self.pulse_starts[c].extend((self.position + starts).tolist())
+
+        block += self.amplitude * (np.cumsum(pulse[:-1], axis=0) > 0)
+        self.position += n
+        return np.clip(np.round(block), ADC_MIN, ADC_MAX).astype(DEFAULT_DTYPE)
+
+    def to_array(self):
+        """The whole capture as one (samples, channels) array."""
+        return np.concatenate(list(self.blocks())) if self.n_samples else np.empty((0, len(self.channels)), DEFAULT_DTYPE)
+
+
+def write_capture_store(path, n_samples, block_size=CHUNK_SIZE, **kwargs):
+    """Write a synthetic capture to a sample store file, block by block. Returns the generator."""
+    capture = SyntheticCapture(n_samples, **kwargs)
+    with SampleStoreWriter(path, capture.channels, capture.sample_rate) as writer:
+        for block in capture.blocks(block_size):
+            writer.append(block)
+    return capture
+
+
+def write_capture_csv(path, n_samples, block_size=CHUNK_SIZE, **kwargs):
+    """Write a synthetic capture as a CSV file with one column per channel. Returns the generator."""
+    capture = SyntheticCapture(n_samples, **kwargs)
+    with open(path, 'w') as f:
+        f.write(','.join(capture.channels) + '\n')
+        for block in capture.blocks(block_size):
+            np.savetxt(f, block, fmt='%d', delimiter=',')
+    return capture
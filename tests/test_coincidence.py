@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from coincidence import match_coincidences, CoincidenceMatcher
+from data_processing import StreamingPeakDetector, detect_channel_peaks, process_chunk
+
+
+def max_matching(reference, other, tolerance):
+    """Size of a maximum one-to-one pairing within `tolerance`, by augmenting paths."""
+    partner = {}
+
+    def augment(i, seen):
+        for j, b in enumerate(other):
+            if abs(b - reference[i]) <= tolerance and j not in seen:
+                seen.add(j)
+                if j not in partner or augment(partner[j], seen):
+                    partner[j] = i
+                    return True
+        return False
+
+    return sum(augment(i, set()) for i in range(len(reference)))
+
+
+def test_competing_peaks_both_paired():
+    reference_index, other_index = match_coincidences([0, 10], [5, 20], 10)
+    assert reference_index.tolist() == [0, 1]
+    assert other_index.tolist() == [0, 1]
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    reference = rng.choice(500, rng.integers(0, 30), replace=False)
+    other = rng.choice(500, rng.integers(0, 30), replace=False)
+    tolerance = int(rng.integers(0, 30))
+
+    reference_index, other_index = match_coincidences(reference, other, tolerance)
+    assert len(set(reference_index.tolist())) == len(reference_index)
+    assert len(set(other_index.tolist())) == len(other_index)
+    assert np.all(np.abs(other[other_index] - reference[reference_index]) <= tolerance)
+    assert len(reference_index) == max_matching(reference.tolist(), other.tolist(), tolerance)
+
+
+@pytest.mark.parametrize('spacing', [1000, 100])
+def test_jittered_trains_fully_paired(spacing):
+    rng = np.random.default_rng(0)
+    reference = np.cumsum(rng.integers(spacing // 2, 3 * spacing // 2, 10000))
+    other = reference + rng.integers(-100, 101, len(reference))
+    reference_index, _ = match_coincidences(reference, other, 100)
+    assert len(reference_index) == len(reference)
+
+
+@pytest.mark.parametrize('chunk_size', [997, 4096, 65536])
+def test_streaming_matches_single_pass(chunk_size):
+    rng = np.random.default_rng(1)
+    n = 500_000
+    signals = np.zeros((n, 2), dtype=np.int16)
+    for start in rng.choice(n - 400, 800, replace=False):
+        width = rng.integers(60, 200)
+        signals[start:start + width, 0] = 1000
+        delayed = max(start + rng.integers(-80, 80), 0)
+        signals[delayed:delayed + width, 1] = 1000
+
+    whole = CoincidenceMatcher(['adc1', 'adc2'], 100)
+    whole.update(detect_channel_peaks(signals, 850, 50))
+
+    detector = StreamingPeakDetector(850, 50, 2)
+    streamed = CoincidenceMatcher(['adc1', 'adc2'], 100)
+    for i in range(0, n, chunk_size):
+        result = process_chunk(signals[i:i + chunk_size], 850, detector=detector, final=i + chunk_size >= n)
+        streamed.update(result['peaks'], result.get('horizon'))
+
+    assert streamed.summary(50000) == whole.summary(50000)
+    assert np.array_equal(streamed.histogram[1], whole.histogram[1])
@@ -0,0 +1,38 @@
+import numpy as np
+
+from event_log import PeakEventLog
+
+
+def test_events_after_returns_new_rows_of_the_current_run(tmp_path):
+    log = PeakEventLog(str(tmp_path / 'peaks.db'))
+    log.new_run(1000, 'first')
+    log.append('adc1', np.arange(10))
+    log.new_run(1000, 'second')
+
+    events, rowid = log.events_after()
+    assert len(events['sample']) == 0
+    log.append('adc1', [5, 7], values=[1.0, 2.0])
+    log.append('adc2', [6])
+    events, rowid = log.events_after()
+    assert events['channel'].tolist() == ['adc1', 'adc1', 'adc2']
+    assert events['sample'].tolist() == [5, 7, 6]
+    assert np.isnan(events['value'][2])
+
+    log.append('adc2', [9])
+    events, rowid = log.events_after(rowid)
+    assert events['sample'].tolist() == [9]
+    events, rowid = log.events_after(rowid)
+    assert len(events['sample']) == 0
+    log.close()
+
+
+def test_events_after_thins_to_the_whole_run(tmp_path):
+    log = PeakEventLog(str(tmp_path / 'peaks.db'))
+    log.new_run(1000)
+    log.append('adc1', np.arange(1000))
+    events, rowid = log.events_after(max_events=100)
+    assert len(events['sample']) == 100
+    log.append('adc1', np.arange(1000, 1100))
+    events, _ = log.events_after(rowid, max_events=100)
+    assert len(events['sample']) == 10  # Every 11th of 1100 rows
+    log.close()
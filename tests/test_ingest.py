@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+from ingest import ingest_csv
+from sample_store import SampleStore
+
+
+def ingest(tmp_path, text, **kwargs):
+    path = tmp_path / 'capture.bin'
+    ingest_csv(io.BytesIO(text.encode()), str(path), 50000, **kwargs)
+    store = SampleStore(str(path))
+    return store.dtype.name, store.data[:].tolist()
+
+
+def test_integers(tmp_path):
+    assert ingest(tmp_path, "adc1,adc2\n1,2\n-3,4\n") == ('int16', [[1, 2], [-3, 4]])
+
+
+def test_decimals_are_rounded(tmp_path):
+    assert ingest(tmp_path, "adc1,adc2\n1.4,2.6\n850.0,4\n") == ('int16', [[1, 3], [850, 4]])
+
+
+def test_unsigned_values(tmp_path):
+    assert ingest(tmp_path, "adc1,adc2\n40000,2\n65535,4\n") == ('uint16', [[40000, 2], [65535, 4]])
+
+
+@pytest.mark.parametrize('text, message', [
+    ("adc1,adc2\n1,2\n70000,4\n", "Value 70000 in column 'adc1', row 2 does not fit"),
+    ("adc1,adc2\n1,\n3,4\n", "Missing or non-numeric value in column 'adc2', row 1"),
+    ("adc1,adc2\n1,x\n3,4\n", "Missing or non-numeric value in column 'adc2', row 1"),
+])
+def test_readable_errors(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        ingest(tmp_path, text)
+
+
+def test_later_block_unsigned(tmp_path):
+    assert ingest(tmp_path, "adc1,adc2\n1,2\n3,4\n5,40000\n", block_rows=2) == \
+        ('uint16', [[1, 2], [3, 4], [5, 40000]])
+
+
+@pytest.mark.parametrize('text, message', [
+    ("adc1,adc2\n-1,2\n3,4\n5,40000\n", "Value 40000 in column 'adc2', row 3 does not fit in int16"),
+    ("adc1,adc2\n1,40000\n3,4\n-5,6\n", "Value -5 in column 'adc1', row 3 does not fit in uint16"),
+])
+def test_later_block_out_of_range(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        ingest(tmp_path, text, block_rows=2)
@@ -0,0 +1,118 @@
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from live_source import LiveSource, encode_frame
+from simulator import simulate
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def listening(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+
+def test_tcp_reconnect_starts_a_new_stream():
+    port = free_port()
+    events = []  # (first sample, samples, gap) per chunk, 'stream' for every new stream
+    source = LiveSource(lambda first_sample, block, gap: events.append((first_sample, len(block), gap)), 2,
+                        '127.0.0.1', port, 'tcp', chunk_size=4000, on_stream=lambda: events.append('stream'))
+    source.start()
+    try:
+        assert wait_for(lambda: listening(port))  # An empty connection is not a stream
+        blocks = [np.full((1000, 2), i, dtype=np.int16) for i in range(10)]
+        for n in (1, 2):
+            simulate(blocks, '127.0.0.1', port, 'tcp', rate=0)
+            assert wait_for(lambda: sum(e[1] for e in events if e != 'stream') == n * 10000)
+    finally:
+        source.stop()
+
+    # Both connections delivered samples 0 to 10000, with the new stream announced in between
+    split = events.index('stream')
+    for stream in (events[:split], events[split + 1:]):
+        assert stream == [(0, 4000, False), (4000, 4000, False), (8000, 2000, False)]
+    assert source.stats()['restarts'] == 1
+
+
+def test_failed_stream_does_not_end_the_listener():
+    port = free_port()
+    chunks = []
+
+    def on_chunk(first_sample, block, gap):
+        if not chunks:
+            chunks.append(None)
+            raise RuntimeError("consumer failed")
+        chunks.append(first_sample)
+
+    source = LiveSource(on_chunk, 2, '127.0.0.1', port, 'tcp', chunk_size=1000)
+    source.start()
+    try:
+        assert wait_for(lambda: listening(port))
+        blocks = [np.zeros((1000, 2), dtype=np.int16)] * 3
+        try:
+            simulate(blocks, '127.0.0.1', port, 'tcp', rate=0)
+        except OSError:
+            pass  # The receiver may close the failed stream before everything is sent
+        assert wait_for(lambda: chunks == [None])
+        simulate(blocks, '127.0.0.1', port, 'tcp', rate=0)
+        assert wait_for(lambda: chunks == [None, 0, 1000, 2000])
+    finally:
+        source.stop()
+    assert not source.thread.is_alive()
+
+
+def handled(frames, **kwargs):
+    """Feed frames (sequence, first sample, samples) to a UDP source; returns its chunks, streams and stats."""
+    events = []
+    source = LiveSource(lambda first_sample, block, gap: events.append((first_sample, len(block), gap)), 2,
+                        chunk_size=100, on_stream=lambda: events.append('stream'), **kwargs)
+    source._reset()
+    for sequence, first_sample, n in frames:
+        source._handle(encode_frame(sequence, first_sample, np.zeros((n, 2), dtype=np.int16)))
+    source._flush(gap=False)
+    return events, source.stats()
+
+
+def test_overlapping_resend_is_trimmed_without_counting_lost_frames():
+    events, stats = handled([(0, 0, 100), (1, 100, 100), (1, 150, 100), (2, 250, 100)])
+    assert events == [(0, 100, False), (100, 100, False), (200, 100, False), (300, 50, False)]
+    assert stats['dropped_frames'] == 0 and stats['late_frames'] == 0
+
+
+def test_reordered_frame_is_late_and_gaps_count_forward_only():
+    events, stats = handled([(0, 0, 100), (2, 200, 100), (1, 100, 100), (3, 300, 100)])
+    assert events == [(0, 100, False), (200, 100, True), (300, 100, False)]
+    assert stats['dropped_frames'] == 1 and stats['late_frames'] == 1
+
+
+def test_sequence_wraps_around():
+    events, stats = handled([(0xFFFFFFFF, 0, 100), (0, 100, 100), (2, 300, 100)])
+    assert [e[0] for e in events] == [0, 100, 300]
+    assert stats['dropped_frames'] == 1 and stats['restarts'] == 0
+
+
+@pytest.mark.parametrize('restart', [
+    [(0, 0, 100), (1, 100, 100)],  # Sequence numbers far behind
+    [(5000, 0, 100), (5001, 100, 100)],  # Newer sequence numbers, older samples
+])
+def test_sender_restart_starts_a_new_stream(restart):
+    events, stats = handled([(1000 + i, 100 * i, 100) for i in range(3)] + restart)
+    assert events[-3:] == ['stream', (0, 100, False), (100, 100, False)]
+    assert stats['restarts'] == 1 and stats['dropped_frames'] == 0 and stats['late_frames'] == 0
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from data_processing import detect_significant_peaks, detect_channel_peaks, StreamingPeakDetector, ThresholdIndex
+
+
+def loop_peaks(signal_data, threshold=850, min_duration=50):
+    """The original per-sample loop detect_significant_peaks replaced."""
+    above_threshold = signal_data > threshold
+    peaks = []
+    start_idx = None
+    for i, is_above in enumerate(above_threshold):
+        if is_above:
+            if start_idx is None:
+                start_idx = i
+        else:
+            if start_idx is not None:
+                if i - start_idx >= min_duration:
+                    peaks.append((start_idx + i) // 2)
+                start_idx = None
+    if start_idx is not None and len(signal_data) - start_idx >= min_duration:
+        peaks.append((start_idx + len(signal_data)) // 2)
+    return peaks
+
+
+def random_signal(rng, n, n_channels=1):
+    """Pulses of random width and gap, so runs often touch either end of the signal."""
+    signals = np.zeros((n, n_channels), dtype=np.int16)
+    for c in range(n_channels):
+        i = int(rng.integers(0, 5))
+        while i < n:
+            width = int(rng.integers(1, 120))
+            signals[i:i + width, c] = rng.integers(851, 1200)
+            i += width + int(rng.integers(1, 120))
+    return signals + rng.integers(0, 851, signals.shape).astype(np.int16) * (signals == 0)
+
+
+@pytest.mark.parametrize('seed', range(50))
+@pytest.mark.parametrize('min_duration', [0, 1, 50])
+def test_matches_loop(seed, min_duration):
+    rng = np.random.default_rng(seed)
+    signal = random_signal(rng, int(rng.integers(0, 3000)))[:, 0]
+    assert detect_significant_peaks(signal, 850, min_duration).tolist() == loop_peaks(signal, 850, min_duration)
+
+
+def test_empty_and_edge_runs():
+    assert detect_significant_peaks(np.array([], dtype=np.int16)).tolist() == []
+    assert detect_significant_peaks(np.full(10, 900), 850, 10).tolist() == [5]  # Open at both ends
+    assert detect_significant_peaks(np.full(10, 900), 850, 11).tolist() == []
+    signal = np.r_[np.full(60, 900), np.zeros(5), np.full(60, 900)]
+    assert detect_significant_peaks(signal).tolist() == loop_peaks(signal)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_channels_match_loop(seed):
+    rng = np.random.default_rng(seed)
+    signals = random_signal(rng, 5000, 4)
+    peaks = detect_channel_peaks(signals, 850, 20)
+    assert [p.tolist() for p in peaks] == [loop_peaks(signals[:, c], 850, 20) for c in range(4)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_streaming_matches_single_pass(seed):
+    rng = np.random.default_rng(seed)
+    signals = random_signal(rng, 20000, 3)
+    expected = detect_channel_peaks(signals, 850, 30)
+
+    # Random chunk split, including empty and one-sample chunks
+    cuts = np.sort(rng.integers(0, len(signals), 40))
+    cuts = np.r_[0, cuts, cuts[:3], len(signals)]
+    cuts.sort()
+    detector = StreamingPeakDetector(850, 30, 3)
+    found = [[] for _ in range(3)]
+    for k, (start, stop) in enumerate(zip(cuts[:-1], cuts[1:])):
+        peaks = detector.update(signals[start:stop], final=k == len(cuts) - 2)
+        for c in range(3):
+            found[c] += peaks[c].tolist()
+    assert [sorted(f) for f in found] == [p.tolist() for p in expected]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('min_duration', [0, 1, 7, 50])
+def test_threshold_index_matches_detection(seed, min_duration):
+    rng = np.random.default_rng(seed)
+    signal = random_signal(rng, int(rng.integers(0, 4000)))[:, 0]
+    thresholds = np.arange(0, 1300, 37)
+    index = ThresholdIndex(signal, thresholds, min_duration)
+    for threshold, count in zip(index.thresholds, index.counts):
+        expected = detect_significant_peaks(signal, threshold, min_duration)
+        assert index.peaks(threshold).tolist() == expected.tolist()
+        assert count == len(expected)
@@ -0,0 +1,169 @@
+import os
+import struct
+import numpy as np
+
+from sample_store import SampleStore
+
+# File layout: fixed header, then levels 1..n_levels back to back. Level k holds, for every bucket
+# of FACTOR**k samples, the minimum and maximum of each channel as a (buckets, channels, 2) array.
+# Level 0 is the sample store itself.
+MAGIC = b'ADCP'
+VERSION = 1
+HEADER_FORMAT = '<4sHHHHQ8s'  # magic, version, factor, level count, channel count, sample count, dtype
+HEADER_SIZE = 64
+FACTOR = 8
+BUILD_BLOCK = FACTOR * 8192  # Samples reduced per step while building, a multiple of FACTOR
+
+
+def pyramid_path(store_path):
+    """Pyramid file kept next to a sample store."""
+    return store_path + '.pyr'
+
+
+def _level_sizes(n_samples, factor, n_levels):
+    return [-(-n_samples // factor ** k) for k in range(1, n_levels + 1)]
+
+
+def _reduce(mins, maxs, factor):
+    """Min of every `factor` rows of `mins` and max of `maxs`, as (groups, channels, 2); a short last group counts too."""
+    n_full = len(mins) // factor
+    reduced = np.empty((-(-len(mins) // factor), mins.shape[1], 2), dtype=mins.dtype)
+    reduced[:n_full, :, 0] = mins[:n_full * factor].reshape(n_full, factor, -1).min(axis=1)
+    reduced[:n_full, :, 1] = maxs[:n_full * factor].reshape(n_full, factor, -1).max(axis=1)
+    if len(mins) % factor:
+        reduced[-1, :, 0] = mins[n_full * factor:].min(axis=0)
+        reduced[-1, :, 1] = maxs[n_full * factor:].max(axis=0)
+    return reduced
+
+
+def build_pyramid(store_path, path=None, factor=FACTOR, min_buckets=1024):
+    """
+    Build the min/max pyramid of a sample store.
+
+    Level 1 is reduced from the samples and every further level from the one below, block by block,
+    so the capture is read once and memory use does not depend on its length. Levels are added until
+    the coarsest has at most `min_buckets` buckets.
+
+    :param store_path: Sample store file.
+    :param path: Output file (default: next to the store, see `pyramid_path`).
+    :param factor: Samples per bucket growth between levels.
+    :param min_buckets: Bucket count below which no coarser level is built.
+    :return: The opened TilePyramid.
+    """
+    path = path or pyramid_path(store_path)
+    store = SampleStore(store_path)
+    n_samples, n_channels = store.data.shape
+
+    n_levels = 1
+    while -(-n_samples // factor ** n_levels) > min_buckets:
+        n_levels += 1
+    sizes = _level_sizes(n_samples, factor, n_levels)
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, factor, n_levels, n_channels, n_samples,
+                         store.dtype.str.encode('ascii'))
+    with open(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.truncate(HEADER_SIZE + sum(sizes) * n_channels * 2 * store.dtype.itemsize)
+
+    levels = _map_levels(path, 'r+', store.dtype, n_channels, sizes)
+    for start in range(0, n_samples, BUILD_BLOCK):
+        samples = store.data[start:start + BUILD_BLOCK]
+        reduced = _reduce(samples, samples, factor)
+        levels[0][start // factor:start // factor + len(reduced)] = reduced
+    for k in range(1, n_levels):
+        for start in range(0, sizes[k - 1], BUILD_BLOCK):
+            block = levels[k - 1][start:start + BUILD_BLOCK]
+            reduced = _reduce(block[:, :, 0], block[:, :, 1], factor)
+            levels[k][start // factor:start // factor + len(reduced)] = reduced
+    for level in levels:
+        level.flush()
+    del levels
+    return TilePyramid(path, store_path)
+
+
+def _map_levels(path, mode, dtype, n_channels, sizes):
+    levels = []
+    offset = HEADER_SIZE
+    for size in sizes:
+        levels.append(np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(size, n_channels, 2)))
+        offset += size * n_channels * 2 * np.dtype(dtype).itemsize
+    return levels
+
+
+class TilePyramid:
+    """
+    Read-only view of a pyramid file together with its sample store.
+
+    `window` picks the finest level that fits the requested number of points, so any zoom level
+    reads and sends about the same amount of data.
+    """
+
+    def __init__(self, path, store_path=None):
+        self.path = path
+        self.store = SampleStore(store_path or path[:-len('.pyr')])
+        with open(path, 'rb') as f:
+            magic, version, factor, n_levels, n_channels, n_samples, dtype = struct.unpack_from(
+                HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tile pyramid")
+        if version != VERSION:
+            raise ValueError(f"Unsupported tile pyramid version {version}")
+        if n_samples != len(self.store):
+            raise ValueError(f"{path} does not match its sample store")
+        self.factor = factor
+        self.n_samples = n_samples
+        self.levels = _map_levels(path, 'r', np.dtype(dtype.rstrip(b'\0').decode('ascii')), n_channels,
+                                  _level_sizes(n_samples, factor, n_levels))
+
+    def level_for(self, start, stop, max_points):
+        """Finest level whose buckets in [start, stop) give at most `max_points` points (2 per bucket)."""
+        span = max(1, stop - start)
+        if span <= max_points:
+            return 0
+        for k in range(1, len(self.levels) + 1):
+            if 2 * -(-span // self.factor ** k) <= max_points:
+                return k
+        return len(self.levels)
+
+    def window(self, channel, start, stop, max_points):
+        """
+        Display points of one channel, or of all channels, for samples [start, stop).
+
+        :param channel: Channel name or column, or None for all channels.
+        :param start: First sample index (clipped to the capture).
+        :param stop: End sample index, exclusive (clipped to the capture).
+        :param max_points: Point budget, e.g. twice the plot width in pixels.
+        :return: Tuple (x, y, level); x are sample indices, at level > 0 each bucket gives its minimum
+                 and maximum at the bucket centre. With channel None, y has one column per channel.
+        """
+        column = self.store.channel_names.index(channel) if isinstance(channel, str) else channel
+        if column is None:
+            column = slice(None)
+        start = int(min(max(start, 0), self.n_samples))
+        stop = int(min(max(stop, start), self.n_samples))
+        level = self.level_for(start, stop, max_points)
+        if level == 0:
+            return np.arange(start, stop), np.array(self.store.data[start:stop, column]), 0
+
+        size = self.factor ** level
+        first, last = start // size, -(-stop // size)
+        buckets = self.levels[level - 1][first:last, column]
+        x = np.repeat(np.arange(first, last) * size + size // 2, 2)
+        if buckets.ndim == 3:
+            # (buckets, channels, 2) -> min and max of each bucket in consecutive rows
+            return x, np.array(buckets).transpose(0, 2, 1).reshape(-1, buckets.shape[1]), level
+        return x, np.array(buckets).reshape(-1), level
+
+    def __len__(self):
+        return self.n_samples
+
+
+def open_pyramid(store_path):
+    """Open the pyramid of a sample store, building it if it is missing or stale."""
+    path = pyramid_path(store_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(store_path):
+        try:
+            return TilePyramid(path, store_path)
+        except ValueError:
+            pass
+    return build_pyramid(store_path, path)
@@ -2,4 +2,28 @@
 CHUNK_SIZE = 50000
 SAMPLE_RATE = 50000
 DISPLAY_TIME = 10  # Display 10 seconds of data
-ANIMATION_SPEED = 10
\ No newline at end of file
+ANIMATION_SPEED = 10
+DISPLAY_WIDTH = 1500  # Approximate plot width in pixels, sizes decimated display traces
+RESULT_CACHE_BYTES = 256 * 1024 * 1024  # Memory budget of the analysis result cache
+THRESHOLD_MIN = 0  # Threshold slider range and step; the threshold index covers every step
+THRESHOLD_MAX = 1000
+THRESHOLD_STEP = 10
+FRAME_QUEUE_SIZE = 8  # Processed chunks waiting for display
+FRAME_QUEUE_POLICY = 'coalesce'  # 'block', 'drop_oldest' or 'coalesce' when the display falls behind
+LIVE_HOST = '0.0.0.0'  # Live ADC source: address and port to listen on, 'udp' or 'tcp'
+LIVE_PORT = 5005
+LIVE_PROTOCOL = 'udp'
+LIVE_FRAME_SAMPLES = 1000  # Samples per channel in one frame sent by the simulator
+LIVE_REORDER_FRAMES = 64  # Live frames may arrive this many frames late; older sequence numbers mean a sender restart
+EVENT_LOG_PATH = 'peaks.db'  # SQLite log of every detected peak
+HISTORY_MAX_MARKERS = 20000  # Peak history plot is thinned to about this many markers
+DATASET_DIR = None  # Uploaded datasets are kept here (None: a temporary directory per server)
+DATASET_STORE_BYTES = 2 * 1024 ** 3  # Disk budget of the dataset store
+DEFAULT_CHANNELS = ('adc1', 'adc2')  # Channels of the live display before a capture is loaded
+CHANNEL_PREFIX = 'adc'  # CSV columns starting with this are ADC channels
+CHANNEL_COLORS = ['blue', 'green', 'orange', 'purple', 'brown', 'magenta', 'olive', 'cyan']  # Cycled per channel
+FRAME_TRANSPORT = 'push'  # Live display updates: 'push' (Server-Sent Events, see frame_stream.py) or 'poll' (dcc.Interval)
+PUSH_MAX_FPS = 30  # Default frame rate cap of a pushed display, the browser can change it
+FRAME_STREAM_PATH = '/frames'  # Server-Sent Events endpoint of the live display
+COINCIDENCE_TOLERANCE = 100  # Peaks on two channels at most this many samples apart are one coincidence
+COINCIDENCE_MAX_BINS = 201  # Bins of the coincidence delay histogram